@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Cast, Upper
 from django.utils.translation import gettext_lazy as _
 
 class CustomUser(AbstractUser):
@@ -17,5 +19,15 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'mobile'
     REQUIRED_FIELDS = ['email', 'username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive prefix lookup (username__istartswith) for the user directory.
+            # Prefix lookups on `mobile` already use the *_like index of its unique constraint.
+            models.Index(
+                OpClass(Upper(Cast('username', models.TextField())), name='text_pattern_ops'),
+                name='accounts_username_prefix_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -1,5 +1,5 @@
 import random
-from django.core.cache import cache # This uses Redis!
+from django.core.cache import cache  # shared Redis cache (CACHES in core/settings.py)
 
 def generate_otp(identifier):
     """Generates a 6-digit OTP and stores it in Redis for 5 minutes."""
@@ -0,0 +1,140 @@
+"""
+Content-addressed attachment storage.
+
+Every attachment file is stored once under blobs/<aa>/<sha256><ext> and shared
+by all messages with the same bytes, so re-uploading or forwarding a file
+costs no extra disk. Blob.ref_count counts the messages pointing at a blob:
+
+    acquire_upload / acquire_path   +1, storing the file if the content is new
+                                    (new images are queued for chat/media.py)
+    add_refs                        +n for forwarded copies
+    release (Message post_delete)   -1, then collect() once the delete commits
+
+All ref changes happen in the caller's transaction, next to the Message rows
+they account for. The Blob row lock orders a new upload against collect() of
+the same content, so a file is never removed while a message is taking it.
+Files are only written, moved or removed once that transaction commits: if
+it rolls back, the source file is left untouched and the upload can be
+retried.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.deletion import ProtectedError
+from django.db.models.functions import Coalesce
+
+from . import media
+from .models import Blob, Message
+
+_READ_SIZE = 1024 * 1024
+
+
+def blob_name(digest, filename=''):
+    """Storage name for content `digest`; keeps the first uploader's extension for serving."""
+    ext = os.path.splitext(filename)[1].lower()[:10]
+    return f"blobs/{digest[:2]}/{digest}{ext}"
+
+
+def hash_file(fileobj):
+    """SHA-256 hex digest and size of a file-like object, read in chunks."""
+    digest, size = hashlib.sha256(), 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(_READ_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def _acquire(digest, size, filename, write, is_image):
+    with transaction.atomic():
+        blob, _ = Blob.objects.select_for_update().get_or_create(
+            sha256=digest, defaults={'size': size, 'file': blob_name(digest, filename)}
+        )
+        if not default_storage.exists(blob.file.name):
+            # Registered before media.schedule(), so the file is in place when processing starts
+            name = blob.file.name
+            transaction.on_commit(lambda: write(name))
+        updates = {'ref_count': F('ref_count') + 1}
+        if is_image and blob.media_state == Blob.MEDIA_NONE:
+            updates['media_state'] = blob.media_state = Blob.MEDIA_PENDING
+            media.schedule(digest)
+        Blob.objects.filter(pk=digest).update(**updates)
+    blob.ref_count += 1
+    return blob
+
+
+def acquire_upload(uploaded_file, is_image=False):
+    """Blob for a Django UploadedFile with one reference taken; writes it only if the content is new."""
+    digest, size = hash_file(uploaded_file)
+
+    def write(name):
+        if default_storage.exists(name):  # a concurrent upload of the same content got there first
+            return
+        saved = default_storage.save(name, uploaded_file)
+        assert saved == name, f"blob {digest} stored as {saved}"
+
+    return _acquire(digest, size, uploaded_file.name, write, is_image)
+
+
+def acquire_path(path, filename='', is_image=False):
+    """
+    Blob for a file already on disk under MEDIA_ROOT (e.g. a finished chunked
+    upload), with one reference taken. Once the transaction commits, the file
+    is moved into the store, or removed if the content is already there.
+    """
+    with open(path, 'rb') as f:
+        digest, size = hash_file(f)
+
+    def write(name):
+        final_path = default_storage.path(name)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(path, final_path)  # same bytes if a concurrent upload stored it first
+
+    def discard():
+        if os.path.exists(path):
+            os.remove(path)
+
+    blob = _acquire(digest, size, filename, write, is_image)
+    transaction.on_commit(discard)
+    return blob
+
+
+def add_refs(blob_id, count=1):
+    """Take `count` more references, e.g. for forwarded copies of a message."""
+    if blob_id and count:
+        Blob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + count)
+
+
+def release(blob_id):
+    """Drop one reference; the blob is collected after the surrounding transaction commits."""
+    Blob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: collect(blob_id))
+
+
+def collect(blob_id):
+    """Delete an unreferenced blob row and its file. Returns True if it was removed."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return False
+        try:
+            blob.delete()
+        except ProtectedError:
+            # The counter drifted below the real number of messages; repair it and keep the blob
+            Blob.objects.filter(pk=blob_id).update(ref_count=blob.messages.count())
+            return False
+        # Removed while the row lock is held, so a concurrent upload of the same content rewrites it
+        default_storage.delete(blob.file.name)
+        if blob.thumbnail:
+            default_storage.delete(blob.thumbnail.name)
+    return True
+
+
+def recount_refs():
+    """Recompute every ref_count from the messages table (repair after crashes or manual edits)."""
+    refs = Message.objects.filter(blob=OuterRef('pk')).order_by().values('blob').annotate(n=Count('pk')).values('n')
+    return Blob.objects.update(ref_count=Coalesce(Subquery(refs), Value(0)))
@@ -0,0 +1,154 @@
+"""
+Chat list rows rendered from a per-row fragment cache.
+
+A row's HTML only depends on its conversation's summary, its unread count,
+the viewer's name for the other user and its preview text (a chat without
+messages reads differently in search and in the plain list). The summary is
+versioned by `Conversation.list_version`, which every message write path
+bumps (record_message / refresh_last_message), so a row's cache key changes
+with whatever it shows and stale fragments are never read again; they
+simply expire. One list render is one get_many for all rows plus a template render
+for the rows that changed since they were last cached.
+
+`changed_rows` powers the chat list's refresh: the client sends the
+`id:version` of every row it shows, and only new, changed and removed rows
+come back as out-of-band swaps.
+
+Between refreshes the list is kept live by `conversation_updated` events:
+when messages are stored, each participant's user group (UserConsumer
+sockets) gets one small frame per conversation with the new preview,
+timestamp and how many of the messages are unread for them, and the client
+patches that row in place.
+"""
+import asyncio
+import hashlib
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import frames
+from .models import Conversation, Message
+from .utils import user_group_name
+
+ROW_TEMPLATE = 'chat/partials/chat_row.html'
+ROW_KEY_PREFIX = 'chat_row:'
+
+
+def row_version(chat):
+    """What a client row is compared by: summary version and unread count."""
+    return f"{chat.list_version}.{chat.unread_count}"
+
+
+def row_cache_key(row):
+    # The preview is part of the key because it is not fully determined by the version:
+    # chats without messages read "Active Chat" in search results and "New connection" in the list
+    texts = hashlib.md5(f"{row['display_name']}\0{row['preview']}".encode()).hexdigest()[:12]
+    return f"{ROW_KEY_PREFIX}{row['id']}:{row['version']}:{texts}"
+
+
+def render_rows(rows):
+    """HTML of each chat list row, from the fragment cache where possible (contact rows are not cached)."""
+    keys = {index: row_cache_key(row) for index, row in enumerate(rows) if row['type'] == 'chat'}
+    cached = cache.get_many(keys.values()) if keys else {}
+
+    html = []
+    missed = {}
+    for index, row in enumerate(rows):
+        fragment = cached.get(keys.get(index))
+        if fragment is None:
+            fragment = render_to_string(ROW_TEMPLATE, {'chat': row})
+            if index in keys:
+                missed[keys[index]] = fragment
+        html.append(mark_safe(fragment))
+    if missed:
+        cache.set_many(missed, getattr(settings, 'CHAT_ROW_CACHE_SECONDS', 24 * 3600))
+    return html
+
+
+def parse_row_versions(value, limit=1000):
+    """{conversation id: version} from the client's 'id:version,...' list (malformed entries are skipped)."""
+    versions = {}
+    for item in value.split(',')[:limit]:
+        chat_id, sep, version = item.partition(':')
+        if sep and chat_id:
+            versions[chat_id] = version
+    return versions
+
+
+def changed_rows(rows, known):
+    """
+    OOB swaps turning the client's rows (`known`, from parse_row_versions)
+    into `rows`, which are in list order. Changed rows are removed and
+    re-inserted after their predecessor in `rows`; unchanged rows never move
+    relative to each other, so the result is in list order too.
+    """
+    current = {str(row['id']) for row in rows}
+    changed = [(index, row) for index, row in enumerate(rows) if known.get(str(row['id'])) != row['version']]
+    removed = [chat_id for chat_id in known if chat_id not in current]
+
+    swaps = [f'<div id="chat-row-{chat_id}" hx-swap-oob="delete"></div>' for chat_id in removed]
+    if changed:
+        swaps.append('<div id="chat-rows-empty" hx-swap-oob="delete"></div>')
+    swaps += [f'<div id="chat-row-{row["id"]}" hx-swap-oob="delete"></div>' for _, row in changed if str(row['id']) in known]
+    for (index, _), fragment in zip(changed, render_rows([row for _, row in changed])):
+        target = f'afterend:#chat-row-{rows[index - 1]["id"]}' if index else 'afterbegin:#chat-rows'
+        swaps.append(f'<div hx-swap-oob="{target}">{fragment}</div>')
+    return mark_safe('\n'.join(swaps))
+
+
+def conversation_updates(messages):
+    """
+    [(user group, frame)] announcing newly stored `messages` to the participants
+    of their conversations: one frame per conversation and participant (group
+    and channel messages are skipped). Participants come from the messages'
+    cached conversations, else from one query.
+    """
+    by_room = {}
+    for msg in messages:
+        if msg.conversation_id:
+            by_room.setdefault(msg.conversation_id, []).append(msg)
+    if not by_room:
+        return []
+
+    participants = {}
+    for room_id, room_messages in by_room.items():
+        if Message.conversation.is_cached(room_messages[0]):
+            conversation = room_messages[0].conversation
+            participants[room_id] = (conversation.initiator_id, conversation.receiver_id)
+    missing = by_room.keys() - participants.keys()
+    if missing:
+        rows = Conversation.objects.filter(id__in=missing).values_list('id', 'initiator_id', 'receiver_id')
+        participants.update((room_id, (initiator_id, receiver_id)) for room_id, initiator_id, receiver_id in rows)
+
+    updates = []
+    for room_id, room_messages in by_room.items():
+        newest = max(room_messages, key=lambda m: (m.timestamp, m.seq or 0))
+        for user_id in {user_id for user_id in participants.get(room_id, ()) if user_id is not None}:
+            updates.append((user_group_name(user_id), {
+                'type': 'conversation_updated',
+                'room_id': str(room_id),
+                'preview': newest.text[:255],
+                'timestamp': newest.timestamp.isoformat(),
+                'seq': newest.seq,
+                'sender_id': str(newest.sender_id),
+                'unread_delta': sum(m.sender_id != user_id for m in room_messages),
+            }))
+    return updates
+
+
+async def publish_conversation_updates(channel_layer, updates):
+    """Send the frames of conversation_updates(), all in one event-loop round."""
+    if channel_layer is None:
+        return
+    await asyncio.gather(*(channel_layer.group_send(group, frames.prepare(payload)) for group, payload in updates))
+
+
+def push_conversation_updates(messages):
+    """conversation_updates() for sync code (HTTP views), sent right away; call after commit."""
+    updates = conversation_updates(messages)
+    if updates:
+        async_to_sync(publish_conversation_updates)(get_channel_layer(), updates)
@@ -1,58 +1,264 @@
-import json
+import time
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Conversation, Message
+from . import fanout, frames, presence, ratelimit, state
+from .forwarding import message_event
+from .models import Conversation, Message, ReadCursor
+from .persistence import get_write_buffer
+from .utils import readable_rooms, room_group_name, user_group_name, writable_rooms
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 from django.utils import timezone
 
 User = get_user_model()
 
-class ChatConsumer(AsyncWebsocketConsumer):
+def parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+class FrameMixin:
+    """
+    Frame codec plumbing (chat/frames.py). Consumers list the inbound frame types
+    they handle in `accepts` and implement receive_frame(); broadcasts arrive
+    pre-encoded and forward() sends them as they are.
+
+    Inbound frames pass the token buckets of chat/ratelimit.py first. A socket
+    with CHAT_SLOW_CONSUMER_BACKLOG broadcasts still waiting for it in this
+    process's channel-layer buffer (it cannot send them as fast as they come)
+    is closed with code 4008 rather than buffering for it without bound. The
+    backlog is counted here, not worked out from publish times, so it does not
+    depend on the clocks of the publishing hosts agreeing with ours.
+    """
+    accepts = ()
+    default_frame_type = None
+    codec = frames.JSON
+    throttled = False  # inside a run of refused frames
+    dropped = False
+
+    async def accept_frames(self):
+        """Accept the socket with the codec negotiated from the offered subprotocols."""
+        self.codec, subprotocol = frames.negotiate(self.scope.get('subprotocols', []))
+        await self.accept(subprotocol)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            frame = frames.decode(text_data, bytes_data, self.accepts, self.default_frame_type)
+        except frames.FrameError as exc:
+            await state.incr_counter('invalid_frames')
+            await self.send_frame({'type': 'frame_error', 'error': str(exc)})
+            return
+
+        scope = await ratelimit.take(self.user.id, self.channel_name, frame['type'])
+        if scope:
+            # Tell the client once per run, and about every message it thinks it sent
+            if not self.throttled or 'client_id' in frame:
+                await self.send_frame({
+                    'type': 'rate_limited', 'frame_type': frame['type'], 'scope': scope,
+                    'client_id': frame.get('client_id'),
+                })
+            self.throttled = True
+            return
+        self.throttled = False
+        await self.receive_frame(frame)
+
+    async def send_frame(self, payload):
+        """Encode and send a frame meant for this socket only."""
+        text_data, bytes_data = frames.encode(payload, self.codec)
+        await self.send(text_data=text_data, bytes_data=bytes_data)
+
+    async def forward(self, event):
+        """Handler for broadcasts: send the encoding the publisher already built."""
+        if self.dropped:
+            return
+        if self.backlog() >= getattr(settings, 'CHAT_SLOW_CONSUMER_BACKLOG', 50):
+            self.dropped = True
+            await state.incr_counter('slow_consumers_dropped')
+            await self.close(code=4008)
+            return
+        if self.codec == frames.MSGPACK:
+            await self.send(bytes_data=event[frames.MSGPACK])
+        else:
+            await self.send(text_data=event[frames.JSON])
+
+    def backlog(self):
+        """Messages received for this socket that it has not handled yet (0 if the layer keeps no buffer)."""
+        queue = getattr(self.channel_layer, 'receive_buffer', {}).get(self.channel_name)
+        return queue.qsize() if queue is not None else 0
+
+class PresenceMixin:
+    """
+    Presence bookkeeping shared by the consumers: every open socket keeps its
+    user online (chat/presence.py). Clients send {"type": "heartbeat"} more
+    often than CHAT_PRESENCE_TTL; changes go only to presence_group(user).
+    """
+    async def presence_connect(self):
+        if await presence.connect(self.user.id, self.channel_name):
+            await self.publish_presence(online=True)
+
+    async def presence_heartbeat(self):
+        if await presence.heartbeat(self.user.id, self.channel_name):
+            await self.publish_presence(online=True)
+
+    async def presence_disconnect(self):
+        last_seen = await presence.disconnect(self.user.id, self.channel_name)
+        if last_seen is not None:
+            await self.publish_presence(online=False, last_seen=last_seen)
+
+    async def publish_presence(self, online, last_seen=None):
+        payload = {'type': 'presence_update', 'user_id': str(self.user.id), 'online': online, 'last_seen': last_seen}
+        await self.channel_layer.group_send(
+            presence.presence_group(self.user.id), frames.prepare(payload, online=online, last_seen=last_seen)
+        )
+
+class BufferedWriteMixin:
+    """Stores socket messages through the per-process write-behind buffer and acks the sender."""
+    async def persist_message(self, msg, client_id=None):
+        """Wait for the write-behind buffer to commit `msg`, then ack the sender with its id."""
+        try:
+            await get_write_buffer().submit(msg)
+        except Exception:
+            await self.send_frame({'type': 'message_error', 'client_id': client_id, 'message_id': str(msg.id)})
+            return False
+        await self.send_frame({'type': 'message_ack', 'client_id': client_id, 'message_id': str(msg.id), 'seq': msg.seq})
+        return True
+
+class SyncMixin:
+    """
+    Catching up after a reconnect. Stored messages are numbered per room
+    (Message.seq, gapless, in commit order) and broadcasts carry the seq once
+    it is known: without CHAT_WRITE_DURABLE a live message is broadcast before
+    it is stored, with seq None, and clients count it as one seq to come rather
+    than as a gap until the room's `message_seqs` frame for its batch
+    (chat/persistence.py) tells them the seq. A client keeps the highest seq it has seen without a gap and
+    sends, on (re)connect or when a seq skips ahead,
+
+        {"type": "sync", "after": <seq>}
+
+    to get the messages after it, oldest first and at most CHAT_SYNC_PAGE_SIZE
+    per reply: {"type": "sync", "messages": [...], "has_more": ...}.
+    {"type": "ack", "seq": <seq>} confirms delivery; the user's ReadCursor.delivered_seq
+    follows it, written at most every CHAT_ACK_FLUSH_SECONDS and on disconnect.
+    Consumers set self.kind and self.room.
+    """
+    acked_seq = flushed_seq = 0
+    ack_flushed_at = 0.0
+
+    async def sync(self, after, limit=None):
+        page_size = getattr(settings, 'CHAT_SYNC_PAGE_SIZE', 200)
+        events, has_more = await self.messages_after(max(after, 0), max(1, min(limit or page_size, page_size)))
+        await self.send_frame({
+            'type': 'sync', 'room_type': self.kind, 'room_id': str(self.room.id),
+            'messages': events, 'has_more': has_more,
+        })
+
+    async def ack(self, seq):
+        if seq <= self.acked_seq:
+            return
+        self.acked_seq = seq
+        if time.monotonic() - self.ack_flushed_at >= getattr(settings, 'CHAT_ACK_FLUSH_SECONDS', 5):
+            await self.flush_ack()
+
+    async def flush_ack(self):
+        if self.acked_seq > self.flushed_seq:
+            self.flushed_seq, self.ack_flushed_at = self.acked_seq, time.monotonic()
+            await self.store_delivered(self.acked_seq)
+
+    def sync_event(self, msg):
+        return message_event(msg)
+
+    @database_sync_to_async
+    def messages_after(self, after, limit):
+        """([events], has_more) for up to `limit` messages with seq > after, by the (room, seq) unique index."""
+        page = list(self.room.messages.filter(seq__gt=after).select_related('sender').order_by('seq')[:limit + 1])
+        return [self.sync_event(m) for m in page[:limit]], len(page) > limit
+
+    @database_sync_to_async
+    def store_delivered(self, seq):
+        # Clients cannot ack past what the room actually holds
+        last_seq = type(self.room).objects.filter(pk=self.room.pk).values_list('last_seq', flat=True).first() or 0
+        ReadCursor.advance_delivered(self.user, min(seq, last_seq), **{self.kind: self.room})
+
+class ChatConsumer(FrameMixin, PresenceMixin, BufferedWriteMixin, SyncMixin, AsyncWebsocketConsumer):
+    accepts = ('chat_message', 'mark_read', 'delete_message', 'call_signal', 'typing', 'heartbeat', 'sync', 'ack')
+    default_frame_type = 'chat_message'
+
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
+        self.room_group_name = room_group_name('conversation', self.room_id)
         self.user = self.scope["user"]
 
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        # Resolve and authorize the room once; every later frame reuses it
+        self.conversation = await self.get_conversation(self.room_id, self.user)
+        if self.conversation is None:
+            await self.close()
+            return
+        self.kind, self.room = 'conversation', self.conversation
+        self.participant_ids = {self.conversation.initiator_id, self.conversation.receiver_id}
+        self.peer_id = (self.participant_ids - {self.user.id} or {self.user.id}).pop()
+        self.peer_status = None  # last presence of the peer sent to this client
+        self.typing = False
+
+        # Room traffic, plus the small groups only open chats join: typing in this
+        # room and the peer's presence
+        self.presence_groups = [presence.viewers_group(self.room_id), presence.presence_group(self.peer_id)]
+        for group in [self.room_group_name] + self.presence_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept_frames()
+        await self.presence_connect()
+        await self.send_peer_status()
         
         # Mark previous messages as read immediately upon connection
-        await self.mark_messages_as_read(self.room_id, self.user)
+        await self.mark_read()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if getattr(self, 'conversation', None) is not None:
+            for group in [self.room_group_name] + self.presence_groups:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            await self.presence_disconnect()
+            await self.flush_ack()
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        msg_type = data.get('type', 'chat_message')
+    async def receive_frame(self, data):
+        msg_type = data['type']
 
         if msg_type == 'chat_message':
             # ... (Existing logic, but also handle file_url if present)
             message = data.get('message', '')
-            user_id = data['user_id']
+            user_id = str(self.user.id)  # never trust the client-supplied id
             reply_to = data.get('reply_to', None)
             file_url = data.get('file_url', None)
             is_media = data.get('is_media', False)
-            timestamp_str = data.get('timestamp', None)
             sender_timezone = data.get('timezone', 'UTC')
+            # Server time, never the client's: read watermarks and unread counts compare
+            # message timestamps with server time, so a skewed or backdated client clock
+            # must not decide what counts as read
+            timestamp = timezone.now()
 
-            # Parse timestamp if provided
-            if timestamp_str:
-                try:
-                    timestamp = timezone.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                except:
-                    timestamp = timezone.now()
-            else:
-                timestamp = timezone.now()
+            client_id = data.get('client_id')
+            durable = getattr(settings, 'CHAT_WRITE_DURABLE', False)
 
-            # If it's a text message, save it. If it has file_url, it was already saved in views.py
+            # If it's a text message, queue it for the write-behind buffer.
+            # If it has file_url, it was already saved in views.py
+            pending = None
+            seq = None  # only known once the message is stored
             if not file_url:
-                await self.save_message(user_id, self.room_id, message, reply_to, timestamp)
+                pending = self.build_message(message, reply_to, timestamp)
+                # Durable mode: only broadcast what is already committed
+                if durable:
+                    if not await self.persist_message(pending, client_id):
+                        return
+                    seq = pending.seq
+            else:
+                seq = await self.stored_seq(data.get('message_id'))
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
+            await self.send_to_room(
                 {
                     'type': 'chat_message',
+                    'message_id': str(pending.id) if pending else data.get('message_id'),
+                    'seq': seq,
                     'message': message,
                     'user_id': user_id,
                     'reply_to': reply_to,
@@ -62,25 +268,53 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     'timezone': sender_timezone
                 }
             )
+
+            if pending and not durable:
+                await self.persist_message(pending, client_id)
+
+            # The message ends the typing burst; the next keystroke is broadcast again
+            if self.typing:
+                self.typing = False
+                await presence.typing(self.room_id, self.user.id, active=False)
+
+        elif msg_type == 'typing':
+            # Clients send this at most every couple of seconds; repeats within
+            # CHAT_TYPING_TTL are coalesced here and never reach the room
+            active = bool(data.get('active', True))
+            if active or self.typing:
+                self.typing = active
+                if await presence.typing(self.room_id, self.user.id, active):
+                    payload = {
+                        'type': 'typing_update', 'user_id': str(self.user.id), 'active': active,
+                        'expires_in': presence.typing_ttl(),
+                    }
+                    await self.channel_layer.group_send(
+                        presence.viewers_group(self.room_id), frames.prepare(payload, user_id=str(self.user.id))
+                    )
+
+        elif msg_type == 'heartbeat':
+            await self.presence_heartbeat()
+            await self.send_peer_status()
+
+        elif msg_type == 'sync':
+            await self.sync(data['after'], data.get('limit'))
+
+        elif msg_type == 'ack':
+            await self.ack(data['seq'])
         
         elif msg_type == 'mark_read':
-            # Broadcast read receipt
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {'type': 'read_receipt', 'reader_id': data['user_id']}
-            )
+            await self.mark_read()
 
         elif msg_type == 'delete_message':
             # Handle message deletion
             message_id = data.get('message_id')
-            user_id = data.get('user_id')
+            user_id = str(self.user.id)
             
             # Verify ownership and delete
-            deleted = await self.delete_message(message_id, user_id)
+            deleted = await self.delete_message(message_id)
             
             # Broadcast deletion to all clients in the room
-            await self.channel_layer.group_send(
-                self.room_group_name,
+            await self.send_to_room(
                 {
                     'type': 'message_deleted',
                     'message_id': message_id,
@@ -91,59 +325,261 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         elif msg_type == 'call_signal':
             # ... (Existing Call Logic) ...
-            await self.channel_layer.group_send(
-                self.room_group_name,
+            await self.send_to_room(
                 {
                     'type': 'send_signal',
-                    'sender_id': data['user_id'],
+                    'sender_id': str(self.user.id),
                     'payload': data['payload'],
                     'signal_type': data['signal_type']
                 }
             )
 
-    async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event))
+    async def mark_read(self):
+        """Advance my watermark to now and, if it moved, tell the room with a read receipt."""
+        read_at = timezone.now()
+        if await self.mark_messages_as_read(read_at):
+            await self.send_to_room(
+                {'type': 'read_receipt', 'reader_id': str(self.user.id), 'read_at': read_at.isoformat()}
+            )
 
-    async def send_signal(self, event):
-        await self.send(text_data=json.dumps(event))
-        
-    async def read_receipt(self, event):
-        await self.send(text_data=json.dumps(event))
+    async def send_to_room(self, payload):
+        """Publish tagged with the room, so multiplexed UserConsumer sockets can tell rooms apart."""
+        await fanout.publish(self.channel_layer, 'conversation', self.conversation.id, payload)
 
-    async def message_deleted(self, event):
-        await self.send(text_data=json.dumps(event))
+    # Room broadcasts arrive encoded by the sender and go out untouched.
+    # chat_message_batch carries several stored messages (e.g. a bulk forward) in one frame.
+    chat_message = chat_message_batch = message_seqs = send_signal = read_receipt = message_deleted = FrameMixin.forward
+
+    async def typing_update(self, event):
+        if event['user_id'] != str(self.user.id):
+            await self.forward(event)
+
+    async def presence_update(self, event):
+        self.peer_status = (event['online'], event['last_seen'])
+        await self.forward(event)
+
+    async def send_peer_status(self):
+        """Tell the client the peer's presence if it changed since we last did (e.g. their process died)."""
+        status = await presence.status(self.peer_id)
+        if (status['online'], status['last_seen']) != self.peer_status:
+            self.peer_status = (status['online'], status['last_seen'])
+            await self.send_frame({'type': 'presence_update', 'user_id': str(self.peer_id), **status})
+
+    def build_message(self, text, reply_to_id=None, timestamp=None):
+        """Unsaved Message from this socket's user in this room (UUID assigned right away)."""
+        return Message(
+            sender=self.user,
+            conversation=self.conversation,
+            text=text,
+            reply_to_id=parse_uuid(reply_to_id) if reply_to_id else None,
+            timestamp=timestamp or timezone.now(),
+        )
 
     @database_sync_to_async
-    def save_message(self, user_id, room_id, text, reply_to_id=None, timestamp=None):
-        user = User.objects.get(id=user_id)
-        conversation = Conversation.objects.get(id=room_id)
-        reply_obj = None
-        if reply_to_id:
-            try:
-                reply_obj = Message.objects.get(id=reply_to_id)
-            except: pass
-        
-        if timestamp:
-            Message.objects.create(sender=user, conversation=conversation, text=text, reply_to=reply_obj, timestamp=timestamp)
-        else:
-            Message.objects.create(sender=user, conversation=conversation, text=text, reply_to=reply_obj)
+    def get_conversation(self, room_id, user):
+        """The room if `user` is one of its two participants, else None."""
+        if not user.is_authenticated or parse_uuid(room_id) is None:
+            return None
+        return Conversation.objects.filter(
+            Q(initiator=user) | Q(receiver=user), id=room_id
+        ).first()
 
     @database_sync_to_async
-    def mark_messages_as_read(self, room_id, user):
-        # Mark all messages NOT sent by me as read
-        if user.is_authenticated:
-            Conversation.objects.get(id=room_id).messages.exclude(sender=user).update(is_read=True)
+    def stored_seq(self, message_id):
+        """Seq of an already stored message in this room (attachments are saved over HTTP first)."""
+        if parse_uuid(message_id) is None:
+            return None
+        return self.conversation.messages.filter(id=message_id).values_list('seq', flat=True).first()
 
     @database_sync_to_async
-    def delete_message(self, message_id, user_id):
-        """Soft-delete message if user is the sender"""
-        try:
-            message = Message.objects.get(id=message_id)
-            # Only allow sender to delete their own message
-            if str(message.sender.id) == str(user_id):
-                message.text = "[Message deleted]"
-                message.save()
-                return True
+    def mark_messages_as_read(self, read_at):
+        # Everything up to read_at counts as read; O(1) regardless of history size
+        return ReadCursor.advance(self.user, read_at, conversation=self.conversation)
+
+    @database_sync_to_async
+    def delete_message(self, message_id):
+        """Soft-delete message if this socket's user is the sender"""
+        if parse_uuid(message_id) is None:
             return False
-        except Message.DoesNotExist:
-            return False
\ No newline at end of file
+        # Only allow sender to delete their own message, and only in this room
+        updated = self.conversation.messages.filter(id=message_id, sender=self.user).update(text="[Message deleted]")
+        if updated:
+            self.conversation.refresh_last_message()
+        return bool(updated)
+
+class UserConsumer(FrameMixin, PresenceMixin, AsyncWebsocketConsumer):
+    """
+    One socket per user instead of one per room (ws/user/). On connect it joins
+    only the user's own group, which gets a compact `conversation_updated`
+    frame whenever a message is stored in one of their conversations
+    (chat/chat_list.py). Room events are not sent until the client asks for
+    them, so an idle dashboard costs one group membership however many groups
+    and channels the user is in; the client adds or drops rooms with
+
+        {"type": "subscribe" | "unsubscribe", "rooms": [{"type": "conversation"|"group"|"channel", "id": ...}]}
+
+    Room events are relayed unchanged; they carry room_type/room_id so the
+    client can tell rooms apart. Sending still goes through ChatConsumer/HTTP.
+    The socket also counts for presence and takes {"type": "heartbeat"} frames.
+    """
+    ROOM_KINDS = ('conversation', 'group', 'channel')
+    accepts = ('subscribe', 'unsubscribe', 'heartbeat')
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.rooms = set()  # {(kind, room_id)}
+        self.max_rooms = getattr(settings, 'CHAT_MUX_MAX_ROOMS', 500)
+        self.user_group = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group, self.channel_name)
+        await self.accept_frames()
+        await self.presence_connect()
+
+    async def disconnect(self, close_code):
+        if not hasattr(self, 'rooms'):
+            return
+        await self.channel_layer.group_discard(self.user_group, self.channel_name)
+        for kind, room_id in self.rooms:
+            await self.channel_layer.group_discard(fanout.member_group(kind, room_id, self.channel_name), self.channel_name)
+        await self.presence_disconnect()
+
+    async def receive_frame(self, data):
+        msg_type = data['type']
+        requested = self.parse_rooms(data.get('rooms'))
+
+        if msg_type == 'subscribe':
+            allowed = await self.readable(requested - self.rooms)
+            room_limit = max(self.max_rooms - len(self.rooms), 0)
+            joined = sorted(allowed)[:room_limit]
+            await self.join(joined)
+            await self.send_frame({
+                'type': 'subscribed',
+                'rooms': [{'type': k, 'id': i} for k, i in joined],
+                'rejected': [{'type': k, 'id': i} for k, i in sorted(requested - self.rooms)],
+            })
+
+        elif msg_type == 'unsubscribe':
+            left = requested & self.rooms
+            for kind, room_id in left:
+                await self.channel_layer.group_discard(fanout.member_group(kind, room_id, self.channel_name), self.channel_name)
+            self.rooms -= left
+            await self.send_frame({
+                'type': 'unsubscribed', 'rooms': [{'type': k, 'id': i} for k, i in sorted(left)],
+            })
+
+        elif msg_type == 'heartbeat':
+            await self.presence_heartbeat()
+
+    async def join(self, rooms):
+        for kind, room_id in rooms:
+            await self.channel_layer.group_add(fanout.member_group(kind, room_id, self.channel_name), self.channel_name)
+        self.rooms.update(rooms)
+
+    def parse_rooms(self, rooms):
+        parsed = set()
+        for room in rooms if isinstance(rooms, list) else []:
+            room_id = parse_uuid(room.get('id')) if isinstance(room, dict) else None
+            if room_id and room.get('type') in self.ROOM_KINDS:
+                parsed.add((room['type'], str(room_id)))
+        return parsed
+
+    @database_sync_to_async
+    def readable(self, rooms):
+        """The subset of `rooms` the user may follow, one query per room kind."""
+        allowed = set()
+        for kind in self.ROOM_KINDS:
+            ids = [room_id for k, room_id in rooms if k == kind]
+            if ids:
+                found = readable_rooms(self.user, kind).filter(id__in=ids).values_list('id', flat=True)
+                allowed.update((kind, str(pk)) for pk in found)
+        return allowed
+
+    # Every event type sent to room groups
+    chat_message = chat_message_batch = message_seqs = read_receipt = message_deleted = send_signal = FrameMixin.forward
+    conversation_updated = FrameMixin.forward
+
+
+class RoomConsumer(FrameMixin, PresenceMixin, BufferedWriteMixin, SyncMixin, AsyncWebsocketConsumer):
+    """
+    Live group and channel rooms (ws/group/<id>/, ws/channel/<id>/). Each socket
+    joins one shard group of its room (chat/fanout.py), so a post to a channel
+    with 100k subscribers costs the sender CHAT_FANOUT_SHARDS group_sends, not
+    one per subscriber. Channels are broadcast-only: only the creator may post.
+    """
+    accepts = ('chat_message', 'mark_read', 'heartbeat', 'sync', 'ack')
+    default_frame_type = 'chat_message'
+
+    async def connect(self):
+        self.kind = self.scope['url_route']['kwargs']['kind']
+        self.room_id = self.scope['url_route']['kwargs']['room_id']
+        self.user = self.scope["user"]
+
+        self.room, self.can_post = await self.get_room()
+        if self.room is None:
+            await self.close()
+            return
+
+        self.group_name = fanout.member_group(self.kind, self.room.id, self.channel_name)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept_frames()
+        await self.presence_connect()
+        await self.mark_read()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'room', None) is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.presence_disconnect()
+            await self.flush_ack()
+
+    async def receive_frame(self, data):
+        msg_type = data['type']
+
+        if msg_type == 'chat_message':
+            client_id = data.get('client_id')
+            text = data.get('message', '').strip()
+            if not self.can_post or not text:
+                await self.send_frame({'type': 'message_error', 'client_id': client_id})
+                return
+
+            msg = Message(sender=self.user, text=text, timestamp=timezone.now(), **{self.kind: self.room})
+            durable = getattr(settings, 'CHAT_WRITE_DURABLE', False)
+            if durable and not await self.persist_message(msg, client_id):
+                return
+            await fanout.publish(self.channel_layer, self.kind, self.room.id, {'type': 'chat_message', **self.sync_event(msg)})
+            if not durable:
+                await self.persist_message(msg, client_id)
+
+        elif msg_type == 'mark_read':
+            await self.mark_read()
+
+        elif msg_type == 'heartbeat':
+            await self.presence_heartbeat()
+
+        elif msg_type == 'sync':
+            await self.sync(data['after'], data.get('limit'))
+
+        elif msg_type == 'ack':
+            await self.ack(data['seq'])
+
+    chat_message = chat_message_batch = message_seqs = FrameMixin.forward
+
+    def sync_event(self, msg):
+        sender = msg.sender  # None once the account is deleted (SET_NULL)
+        return {'sender_name': sender and (sender.first_name or sender.username), **message_event(msg)}
+
+    @database_sync_to_async
+    def get_room(self):
+        """(room, may post) if the user may follow this group/channel, else (None, False)."""
+        if not self.user.is_authenticated or parse_uuid(self.room_id) is None:
+            return None, False
+        room = readable_rooms(self.user, self.kind).filter(id=self.room_id).first()
+        if room is None:
+            return None, False
+        return room, writable_rooms(self.user, self.kind).filter(id=room.id).exists()
+
+    @database_sync_to_async
+    def mark_read(self):
+        ReadCursor.advance(self.user, timezone.now(), **{self.kind: self.room})
@@ -0,0 +1,75 @@
+"""
+Live delivery for rooms of any size.
+
+A room's sockets are spread over CHAT_FANOUT_SHARDS[kind] channel-layer groups
+(`channel_<id>.0` ... `channel_<id>.7`), each socket joining the one picked by
+a hash of its channel name. Publishing is one group_send per shard, all sent
+concurrently, so the cost for the sender depends on the shard count, never on
+the number of subscribers: the channel layer copies the event to each group's
+sockets itself. Sharding keeps every group_send a bounded amount of work for
+one Redis call (channels_redis fans out a group in a single script), and with
+several Redis hosts the shards of a big channel land on different servers.
+
+Conversations have two participants and keep a single group, the one
+ChatConsumer already joins.
+
+Subscriber lists are never loaded whole: iter_member_ids() walks the
+membership table in keyset batches of CHAT_FANOUT_BATCH_SIZE.
+"""
+import asyncio
+import zlib
+
+from django.conf import settings
+
+from . import frames
+from .models import Channel, Group
+from .utils import room_group_name
+
+MEMBERSHIP = {'group': Group.members, 'channel': Channel.subscribers}
+
+
+def shard_count(kind):
+    if kind == 'conversation':
+        return 1
+    return getattr(settings, 'CHAT_FANOUT_SHARDS', {}).get(kind, 1)
+
+
+def shard_groups(kind, room_id):
+    """Every channel-layer group a room's sockets may be in."""
+    shards = shard_count(kind)
+    if shards == 1:
+        return [room_group_name(kind, room_id)]
+    return [f"{room_group_name(kind, room_id)}.{n}" for n in range(shards)]
+
+
+def member_group(kind, room_id, channel_name):
+    """The channel-layer group the socket `channel_name` joins to follow a room."""
+    groups = shard_groups(kind, room_id)
+    return groups[zlib.crc32(channel_name.encode()) % len(groups)]
+
+
+async def publish(channel_layer, kind, room_id, payload, **meta):
+    """
+    Send the frame `payload` to every socket following the room: encoded once
+    (chat/frames.py), then one group_send per shard.
+    """
+    payload.update(room_type=kind, room_id=str(room_id))
+    event = frames.prepare(payload, **meta)
+    await asyncio.gather(*(channel_layer.group_send(group, event) for group in shard_groups(kind, room_id)))
+
+
+def iter_member_ids(kind, room_id, batch_size=None):
+    """
+    User ids of a group's members / a channel's subscribers, as lists of at most
+    `batch_size`, paged on the membership row id so memory stays flat at 100k+.
+    """
+    batch_size = batch_size or getattr(settings, 'CHAT_FANOUT_BATCH_SIZE', 5000)
+    field = MEMBERSHIP[kind].field
+    rows = field.remote_field.through.objects.filter(**{f"{field.m2m_field_name()}_id": room_id}).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).values_list('id', f"{field.m2m_reverse_field_name()}_id")[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield [user_id for _, user_id in batch]
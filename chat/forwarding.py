@@ -0,0 +1,158 @@
+"""
+Set-based message forwarding: any number of source messages to any number of
+target conversations, groups and channels with a fixed number of queries.
+
+    1 SELECT   sources, filtered to what the user can read
+    1 SELECT   per target kind, filtered to rooms the user can post into
+    1 UPDATE   per target room, to number the copies (Message.allocate_seqs)
+    1 INSERT   all copies (bulk_create)
+    1 UPDATE   per distinct attachment blob, per target conversation summary
+then one channel-layer fan-out: a single `chat_message_batch` event per target
+room (per shard for big rooms, see chat/fanout.py), plus a
+`conversation_updated` frame per conversation participant for the chat list
+(chat/chat_list.py), all sent concurrently.
+"""
+import asyncio
+import uuid
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from . import blobs, fanout
+from .chat_list import conversation_updates, publish_conversation_updates
+from .models import Message
+from .utils import readable_messages, writable_rooms
+
+TARGET_KINDS = ('conversation', 'group', 'channel')
+
+
+class ForwardError(Exception):
+    """
+    A target the user may not post into (or that does not exist), or a
+    malformed request; `status` is the HTTP status to reply with.
+    """
+
+    def __init__(self, message, status=403):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_ids(ids):
+    """`ids` as UUIDs; a malformed one raises ForwardError (400) instead of failing in the query."""
+    try:
+        return [uuid.UUID(str(value)) for value in ids]
+    except ValueError:
+        raise ForwardError("Malformed message or target id", status=400) from None
+
+
+def resolve_targets(user, targets):
+    """
+    [(kind, room)] for `targets` given as [(kind, id)]; all or nothing, so a
+    request naming any foreign or unknown room raises ForwardError.
+    """
+    wanted = {kind: set() for kind in TARGET_KINDS}
+    for kind, room_id in targets:
+        if kind not in wanted:
+            raise ForwardError(f"Unknown target type {kind!r}")
+        wanted[kind].update(parse_ids([room_id]))
+
+    resolved = []
+    for kind, ids in wanted.items():
+        if not ids:
+            continue
+        rooms = list(writable_rooms(user, kind).filter(id__in=ids).distinct())
+        if len(rooms) != len(ids):
+            raise ForwardError(f"Not allowed to post in one or more {kind}s")
+        resolved += [(kind, room) for room in rooms]
+    return resolved
+
+
+def forward_messages(user, message_ids, targets):
+    """
+    Copy the readable messages among `message_ids` into every target room.
+    Returns the new Message rows (unreadable or unknown sources are skipped).
+    """
+    rooms = resolve_targets(user, targets)
+    message_ids = parse_ids(message_ids)
+    sources = list(
+        readable_messages(user).filter(id__in=message_ids)
+        .only('id', 'text', 'attachment', 'blob', 'is_media')
+        .order_by('timestamp', 'id')
+    )
+    if not sources or not rooms:
+        return []
+
+    copies = []
+    now = timezone.now()
+    for kind, room in rooms:
+        # Copies share a timestamp, so ascending ids keep the source order in (timestamp, id) paging
+        ids = sorted(uuid.uuid4() for _ in sources)
+        copies += [
+            Message(
+                id=new_id,
+                sender=user,
+                text=f"[Forwarded]: {msg.text}",
+                attachment=msg.attachment.name or None,
+                blob_id=msg.blob_id,
+                is_media=msg.is_media,
+                is_forwarded=True,
+                timestamp=now,
+                **{kind: room},
+            )
+            for new_id, msg in zip(ids, sources)
+        ]
+
+    blob_refs = Counter(copy.blob_id for copy in copies if copy.blob_id)
+    with transaction.atomic():
+        Message.allocate_seqs(copies)
+        Message.objects.bulk_create(copies)
+        for blob_id, count in blob_refs.items():
+            blobs.add_refs(blob_id, count)
+        last_per_room = {}
+        for copy in copies:
+            last_per_room[copy.conversation_id] = copy
+        for kind, room in rooms:
+            if kind == 'conversation':
+                room.record_message(last_per_room[room.id])
+
+    broadcast_messages(copies)
+    return copies
+
+
+def message_event(msg):
+    """The `chat_message` payload ChatConsumer sends for a stored message."""
+    return {
+        'message_id': str(msg.id),
+        'seq': msg.seq,
+        'message': msg.text,
+        'user_id': str(msg.sender_id),
+        'reply_to': str(msg.reply_to_id) if msg.reply_to_id else None,
+        'file_url': msg.attachment.url if msg.attachment else None,
+        'is_media': msg.is_media,
+        'is_forwarded': msg.is_forwarded,
+        'timestamp': msg.timestamp.isoformat(),
+    }
+
+
+def broadcast_messages(messages):
+    """One `chat_message_batch` publish per room, all in a single event-loop round."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not messages:
+        return
+
+    batches = {}
+    for msg in messages:
+        kind, room_id = msg.room_key
+        batches.setdefault((kind, str(room_id)), []).append(message_event(msg))
+    updates = conversation_updates(messages)
+
+    async def fan_out():
+        await asyncio.gather(*(
+            fanout.publish(channel_layer, kind, room_id, {'type': 'chat_message_batch', 'messages': events})
+            for (kind, room_id), events in batches.items()
+        ), publish_conversation_updates(channel_layer, updates))
+
+    async_to_sync(fan_out)()
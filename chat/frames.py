@@ -0,0 +1,136 @@
+"""
+WebSocket frame codec.
+
+Inbound frames are checked against INBOUND before a consumer sees them: the
+type must be one the consumer accepts, declared fields must have the declared
+types, and undeclared fields are dropped. A bad frame raises FrameError, which
+the consumer reports back to the client as a `frame_error` frame.
+
+Outbound broadcasts are encoded once, by the sender, before group_send:
+prepare() turns a payload into a channel-layer event carrying the ready-made
+JSON text and msgpack bytes, and each recipient socket forwards the encoding
+it negotiated without touching the payload again.
+
+The encoding is negotiated at connect with the WebSocket subprotocol:
+`chat.msgpack` (binary frames, if msgpack is installed), `chat.json`, or none
+for plain JSON text frames as before. Inbound frames may use either, told
+apart by text vs binary.
+"""
+import json
+
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack ships with channels_redis
+    msgpack = None
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+SUBPROTOCOLS = {'chat.msgpack': MSGPACK, 'chat.json': JSON}
+
+_encode_json = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+class FrameError(Exception):
+    """A frame that is malformed, too large, of an unknown type or with a badly typed field."""
+
+
+class FrameSpec:
+    """Fields of one inbound frame type: {name: (allowed types, required)}."""
+
+    def __init__(self, **fields):
+        self.types = {name: types for name, (types, _) in fields.items()}
+        self.required = [name for name, (_, required) in fields.items() if required]
+
+    def clean(self, frame):
+        cleaned = {}
+        for name, value in frame.items():
+            types = self.types.get(name)
+            if types is None:
+                continue
+            # bool is an int subclass; only accept it where declared
+            if not isinstance(value, types) or (value.__class__ is bool and bool not in types):
+                raise FrameError(f"{frame['type']}: bad type for {name!r}")
+            cleaned[name] = value
+        for name in self.required:
+            if name not in cleaned:
+                raise FrameError(f"{frame['type']}: missing {name!r}")
+        cleaned['type'] = frame['type']
+        return cleaned
+
+
+_str = (str,)
+_opt_str = (str, type(None))
+_id = (str, int, type(None))
+
+INBOUND = {
+    'chat_message': FrameSpec(
+        message=(_str, False), reply_to=(_opt_str, False), file_url=(_opt_str, False), is_media=((bool,), False),
+        timestamp=(_opt_str, False), timezone=(_opt_str, False), client_id=(_id, False), message_id=(_opt_str, False),
+    ),
+    'mark_read': FrameSpec(),
+    'delete_message': FrameSpec(message_id=(_str, True)),
+    'call_signal': FrameSpec(signal_type=(_str, True), payload=((dict,), True)),
+    'typing': FrameSpec(active=((bool,), False)),
+    'heartbeat': FrameSpec(),
+    'subscribe': FrameSpec(rooms=((list,), True)),
+    'unsubscribe': FrameSpec(rooms=((list,), True)),
+    'sync': FrameSpec(after=((int,), True), limit=((int,), False)),
+    'ack': FrameSpec(seq=((int,), True)),
+}
+
+
+def negotiate(subprotocols):
+    """(codec, subprotocol to accept or None) for the subprotocols the client offered."""
+    for offered in subprotocols:
+        codec = SUBPROTOCOLS.get(offered)
+        if codec == MSGPACK and msgpack is None:
+            continue
+        if codec:
+            return codec, offered
+    return JSON, None
+
+
+def decode(text_data=None, bytes_data=None, accepts=(), default_type=None):
+    """A validated inbound frame dict. `accepts` lists the types the consumer handles."""
+    raw = text_data if text_data is not None else bytes_data
+    if raw is None:
+        raise FrameError("empty frame")
+    if len(raw) > getattr(settings, 'CHAT_MAX_FRAME_BYTES', 64 * 1024):
+        raise FrameError("frame too large")
+    try:
+        if text_data is not None:
+            frame = json.loads(text_data)
+        elif msgpack is not None:
+            frame = msgpack.unpackb(bytes_data, raw=False)
+        else:
+            raise FrameError("binary frames are not supported")
+    except (ValueError, TypeError) as exc:  # msgpack's unpack errors are ValueErrors too
+        raise FrameError("undecodable frame") from exc
+
+    if not isinstance(frame, dict):
+        raise FrameError("frame must be an object")
+    frame.setdefault('type', default_type)
+    if frame['type'] not in accepts or frame['type'] not in INBOUND:
+        raise FrameError(f"unknown frame type {frame['type']!r}")
+    return INBOUND[frame['type']].clean(frame)
+
+
+def encode(payload, codec):
+    """(text_data, bytes_data) for one frame to a single socket."""
+    if codec == MSGPACK:
+        return None, msgpack.packb(payload)
+    return _encode_json(payload), None
+
+
+def prepare(payload, **meta):
+    """
+    Channel-layer event for broadcasting `payload`: both encodings are built here,
+    once. The handler is payload['type']; `meta` carries the few fields recipient
+    handlers look at themselves (e.g. who is typing) without decoding the frame.
+    """
+    event = {'type': payload['type'], JSON: _encode_json(payload), **meta}
+    if msgpack is not None:
+        event[MSGPACK] = msgpack.packb(payload)
+    return event
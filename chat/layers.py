@@ -0,0 +1,308 @@
+"""
+Channel layer sharded across several Redis nodes with a consistent-hash ring.
+
+channels_redis already spreads groups and channels over its `hosts`, but it
+cuts the crc32 space into len(hosts) equal ranges, so adding a node moves
+about half of all groups to another node. Here every node owns `vnodes`
+points on a 32-bit ring, placed by hashing the node's address (not its
+position in the list), and a group or channel belongs to the first point at or
+after its own hash. Adding an n+1th node only moves the ~1/(n+1) of the keys
+that now fall on its points; removing one only moves the keys it owned.
+
+Room groups are what gets spread: a big channel's shard groups (chat/fanout.py)
+usually land on different nodes, so one post is sent by several Redis servers
+at once. Per-process reply channels (`specific.<client prefix>!`) hash like any
+other name, so each worker reads its inbound messages from one node.
+
+HybridChannelLayer adds an in-process fast path on top: group members in the
+sending process get messages from memory, and only the other processes
+are reached through Redis. That hop is Redis pub/sub, so it is at-most-once:
+a message reaches only the inboxes subscribed when it is published. While a
+process resubscribes after a Redis error (or is still subscribing), group
+messages published to it are lost rather than queued. Chat clients find the
+gap by seq, also for messages broadcast before they are stored (their seqs
+follow in a `message_seqs` frame, chat/persistence.py), and fetch the
+missing messages with a `sync` frame (SyncMixin in chat/consumers.py).
+
+    manage.py redis_nodes          runs local redis-server processes to shard across
+    manage.py bench_layer          group_send throughput for 1..N nodes
+    manage.py bench_chat_latency   one-to-one round trips, Redis-only vs. hybrid
+"""
+import asyncio
+import binascii
+import bisect
+import collections
+import contextlib
+import hashlib
+import logging
+import uuid
+import weakref
+
+from channels_redis.core import RedisChannelLayer
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VNODES = 160
+
+
+def node_name(host):
+    """Stable ring identity of a decoded channels_redis host entry."""
+    if 'address' in host:
+        return str(host['address'])
+    if 'master_name' in host:
+        return f"sentinel:{host['master_name']}"
+    return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+
+
+class HashRing:
+    """Maps keys to node indexes; each node is hashed onto the ring `vnodes` times."""
+
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        points = sorted(
+            (int.from_bytes(hashlib.md5(f"{node}#{replica}".encode()).digest()[:4], 'big'), index)
+            for index, node in enumerate(nodes)
+            for replica in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def node_for(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf8')
+        position = bisect.bisect_left(self._points, binascii.crc32(key))
+        return self._owners[position % len(self._points)]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer whose groups and channels are placed by a HashRing over its hosts."""
+
+    def __init__(self, hosts=None, vnodes=DEFAULT_VNODES, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.ring = HashRing([node_name(host) for host in self.hosts], vnodes)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        # send() hashes the full `specific.<prefix>!<local>` name but receive() reads the
+        # process's queue `specific.<prefix>!`; both must land on the same node
+        if '!' in value:
+            value = self.non_local_name(value)
+        return self.ring.node_for(value)
+
+
+class _LoopState:
+    """Hybrid-layer state of one event loop: its inbox, local group members, registry cache and readers."""
+
+    def __init__(self):
+        self.inbox = uuid.uuid4().hex
+        self.members = {}  # {group: {channel names of this process}}
+        self.inboxes = {}  # {group: frozenset(inbox ids)}, only trusted while subscribed
+        self.invalidations = collections.Counter()  # {group: membership changes seen}
+        self.subscribed = asyncio.Event()
+        self.listener = None  # task reading the inbox and change notices
+        self.reader = None  # task moving direct sends from Redis into receive buffers
+
+
+class HybridChannelLayer(ShardedRedisChannelLayer):
+    """
+    Delivers group messages to members in this process straight from memory
+    and uses Redis only for members elsewhere.
+
+    Every event loop that adds channels to groups gets an inbox, a pub/sub
+    channel it subscribes to on every node. A membership registry, one Redis
+    set per group (`<prefix>:members:<group>`, on the group's ring node), lists
+    the inboxes with members. group_send() puts the message into the receive
+    buffers of local members as is, never serialized, and publishes it once,
+    serialized, to each other inbox in the registry; that loop then hands it
+    to its own members. When every member is local, nothing touches Redis:
+    each loop caches the registry sets it has read and drops an entry when a
+    `<prefix>:members-changed` notice for that group arrives.
+
+    Inboxes of dead processes are pruned when a publish to them reaches no
+    subscriber. Direct send() to a channel still goes through Redis; one task
+    per loop reads those into the same receive buffers, so receive() simply
+    waits on the channel's buffer whichever way a message came.
+    Only channels created by this process can be added to groups.
+    """
+    registry_cache_size = 10000
+    subscribe_timeout = 5
+
+    def __init__(self, hosts=None, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self._loop_states = weakref.WeakKeyDictionary()  # {event loop: _LoopState}
+        self.changes_channel = f"{self.prefix}:members-changed"
+
+    def _members_key(self, group):
+        return f"{self.prefix}:members:{group}"
+
+    def _inbox_channel(self, inbox):
+        return f"{self.prefix}:inbox:{inbox}"
+
+    def _loop_state(self, create=False):
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None and create:
+            state = self._loop_states[loop] = _LoopState()
+        return state
+
+    async def receive(self, channel):
+        if "!" not in channel:
+            return await super().receive(channel)
+        assert self.require_valid_channel_name(channel), "Channel name not valid"
+        real_channel = self.non_local_name(channel)
+        assert real_channel.endswith(self.client_prefix + "!"), "Wrong client prefix"
+        state = self._loop_state(create=True)
+        if state.reader is None or state.reader.done():
+            state.reader = asyncio.get_running_loop().create_task(self._read_direct(real_channel))
+        try:
+            return await self.receive_buffer[channel].get()
+        finally:
+            buffer = self.receive_buffer.get(channel)
+            if buffer is not None and buffer.empty():
+                del self.receive_buffer[channel]
+
+    async def _read_direct(self, real_channel):
+        """Messages sent to this process's channels through Redis, into their receive buffers."""
+        while True:
+            try:
+                message_channel, message = await self.receive_single(real_channel)
+            except (RedisError, OSError):
+                logger.warning("Channel layer could not read %s; retrying", real_channel, exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            for channel in message_channel if isinstance(message_channel, list) else [message_channel]:
+                self.receive_buffer[channel].put_nowait(message)
+
+    ### Groups extension ###
+
+    async def group_add(self, group, channel):
+        assert self.require_valid_group_name(group), "Group name not valid"
+        assert self.require_valid_channel_name(channel), "Channel name not valid"
+        assert self.non_local_name(channel).endswith(self.client_prefix + "!"), "Not a channel of this process"
+        state = await self._subscribe()
+        members = state.members.setdefault(group, set())
+        members.add(channel)
+        if len(members) == 1:
+            await self._announce(group, sadd=[state.inbox])
+
+    async def group_discard(self, group, channel):
+        assert self.require_valid_group_name(group), "Group name not valid"
+        assert self.require_valid_channel_name(channel), "Channel name not valid"
+        state = self._loop_state()
+        members = state.members.get(group) if state else None
+        if not members or channel not in members:
+            return
+        members.discard(channel)
+        if not members:
+            del state.members[group]
+            await self._announce(group, srem=[state.inbox])
+
+    async def group_send(self, group, message):
+        assert self.require_valid_group_name(group), "Group name not valid"
+        state = self._loop_state()
+        for channel in state.members.get(group, ()) if state else ():
+            self.receive_buffer[channel].put_nowait(dict(message))
+
+        remote = [inbox for inbox in await self._registered_inboxes(state, group) if not state or inbox != state.inbox]
+        if not remote:
+            return
+        body = group.encode('utf8') + b' ' + self.serialize(message)
+        async with self.connection(self.consistent_hash(group)).pipeline(transaction=False) as pipe:
+            for inbox in remote:
+                pipe.publish(self._inbox_channel(inbox), body)
+            receivers = await pipe.execute()
+        dead = [inbox for inbox, count in zip(remote, receivers) if not count]
+        if dead:
+            await self._announce(group, srem=dead)
+
+    async def flush(self):
+        await super().flush()
+        for state in list(self._loop_states.values()):
+            state.members.clear()
+            state.inboxes.clear()
+
+    async def close_pools(self):
+        state = self._loop_state()
+        tasks = [task for task in (state.listener, state.reader) if task is not None] if state else []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await super().close_pools()
+
+    ### Membership registry ###
+
+    async def _announce(self, group, sadd=(), srem=()):
+        """Change the group's registry set and tell every loop to drop its cached copy."""
+        async with self.connection(self.consistent_hash(group)).pipeline(transaction=False) as pipe:
+            if sadd:
+                pipe.sadd(self._members_key(group), *sadd)
+            if srem:
+                pipe.srem(self._members_key(group), *srem)
+            pipe.publish(self.changes_channel, group)
+            await pipe.execute()
+
+    async def _registered_inboxes(self, state, group):
+        cacheable = state is not None and state.subscribed.is_set()
+        if cacheable and group in state.inboxes:
+            return state.inboxes[group]
+        seen = state.invalidations[group] if cacheable else None
+        inboxes = frozenset(
+            inbox.decode('utf8') for inbox in await self.connection(self.consistent_hash(group)).smembers(self._members_key(group))
+        )
+        # A change notice that arrived while we were reading may describe a newer set
+        if cacheable and state.subscribed.is_set() and state.invalidations[group] == seen:
+            if len(state.inboxes) >= self.registry_cache_size:
+                state.inboxes.clear()
+            state.inboxes[group] = inboxes
+        return inboxes
+
+    async def _subscribe(self):
+        """This loop's state, once its inbox is subscribed on every node."""
+        state = self._loop_state(create=True)
+        if state.listener is None or state.listener.done():
+            state.listener = asyncio.get_running_loop().create_task(self._listen(state))
+        await asyncio.wait_for(state.subscribed.wait(), self.subscribe_timeout)
+        return state
+
+    async def _listen(self, state):
+        """Deliver this loop's inbox and apply membership changes; resubscribes after Redis errors."""
+        while True:
+            pubsubs = []
+            try:
+                for index in range(self.ring_size):
+                    pubsub = self.connection(index).pubsub()
+                    pubsubs.append(pubsub)
+                    await pubsub.subscribe(self.changes_channel, self._inbox_channel(state.inbox))
+                    for _ in range(2):
+                        await pubsub.get_message(timeout=self.subscribe_timeout)  # subscribe confirmations
+                # Re-register after a reconnect: publishers may have pruned this inbox meanwhile
+                for group in list(state.members):
+                    await self._announce(group, sadd=[state.inbox])
+                state.subscribed.set()
+                await asyncio.gather(*(self._drain(state, pubsub) for pubsub in pubsubs))
+            except (RedisError, OSError):
+                logger.warning("Channel layer inbox %s lost its subscription; retrying", state.inbox, exc_info=True)
+            finally:
+                state.subscribed.clear()
+                state.inboxes.clear()
+                for pubsub in pubsubs:
+                    with contextlib.suppress(RedisError, OSError):
+                        await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    async def _drain(self, state, pubsub):
+        async for item in pubsub.listen():
+            if item['type'] != 'message':
+                continue
+            if item['channel'].decode('utf8') == self.changes_channel:
+                group = item['data'].decode('utf8')
+                state.invalidations[group] += 1
+                state.inboxes.pop(group, None)
+                continue
+            group, _, body = item['data'].partition(b' ')
+            members = state.members.get(group.decode('utf8'))
+            if members:
+                message = self.deserialize(body)
+                for channel in members:
+                    self.receive_buffer[channel].put_nowait(dict(message))
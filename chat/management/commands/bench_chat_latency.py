@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import frames
+from chat.layers import HybridChannelLayer, ShardedRedisChannelLayer
+
+from .redis_nodes import LocalRedisNodes
+
+MODES = {
+    'redis': "every hop through Redis (ShardedRedisChannelLayer)",
+    'hybrid-local': "both users on one worker (HybridChannelLayer, in memory)",
+    'hybrid-remote': "users on two workers (HybridChannelLayer, via Redis)",
+}
+
+
+def make_layer(mode, hosts):
+    layer_class = ShardedRedisChannelLayer if mode == 'redis' else HybridChannelLayer
+    return layer_class(hosts=hosts)
+
+
+async def join(layer, group):
+    channel = await layer.new_channel()
+    await layer.group_add(group, channel)
+    return channel
+
+
+async def echo(layer, inbound, outbound, count, ready=None):
+    """The peer: answer every message in `inbound` by posting it to `outbound`."""
+    channel = await join(layer, inbound)
+    if ready is not None:
+        ready.set()
+    for _ in range(count):
+        await layer.group_send(outbound, await layer.receive(channel))
+    await layer.group_discard(inbound, channel)
+
+
+def remote_echo(hosts, inbound, outbound, count, ready):
+    async def run():
+        layer = make_layer('hybrid-remote', hosts)
+        await echo(layer, inbound, outbound, count, ready)
+        await layer.close_pools()
+    asyncio.run(run())
+
+
+async def ping(layer, alice, bob, total, local_peer):
+    """Round trips of a chat_message event between two room groups, as two users chatting would send them."""
+    peer = None
+    if local_peer:
+        started = asyncio.Event()
+        peer = asyncio.ensure_future(echo(layer, bob, alice, total, started))
+        await started.wait()
+
+    channel = await join(layer, alice)
+    rtts = []
+    for n in range(total):
+        event = frames.prepare({'type': 'chat_message', 'message': f"message {n}", 'user_id': '1'})
+        start = time.perf_counter()
+        await layer.group_send(bob, event)
+        await layer.receive(channel)
+        rtts.append(time.perf_counter() - start)
+    await layer.group_discard(alice, channel)
+    if peer is not None:
+        await peer
+    await layer.close_pools()
+    return rtts[1:]  # the first round trip only warms up connections
+
+
+class Command(BaseCommand):
+    help = (
+        "One-to-one chat latency: round trips of a chat_message between two users' room groups, "
+        "with every hop through Redis, on one worker with the hybrid layer's in-memory path, "
+        "and across two workers with the hybrid layer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--modes', default=','.join(MODES), help=f"Comma-separated: {', '.join(MODES)}")
+        parser.add_argument('--url', help="redis:// URL of a running node (default: start a local one)")
+        parser.add_argument('--base-port', type=int, default=7001)
+        parser.add_argument('--redis-server', default='redis-server')
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+
+        if options['url']:
+            nodes, hosts = nullcontext(), [options['url']]
+        else:
+            nodes = LocalRedisNodes(1, options['base_port'], options['redis_server'])
+            hosts = nodes.urls
+
+        self.stdout.write(f"{options['messages']} round trips per mode")
+        with nodes:
+            for mode in modes:
+                rtts = self.run_mode(mode, hosts, options['messages'] + 1)
+                rtts.sort()
+                pct = lambda p: rtts[min(int(len(rtts) * p), len(rtts) - 1)] * 1e6
+                self.stdout.write(
+                    f"  {mode:<14} p50 {pct(0.50):>8.0f}us  p99 {pct(0.99):>8.0f}us  "
+                    f"mean {statistics.mean(rtts) * 1e6:>8.0f}us   {MODES[mode]}"
+                )
+
+    def run_mode(self, mode, hosts, total):
+        alice, bob = f"chat_{uuid.uuid4()}", f"chat_{uuid.uuid4()}"
+        if mode != 'hybrid-remote':
+            return asyncio.run(ping(make_layer(mode, hosts), alice, bob, total, local_peer=True))
+
+        # Forked before this process runs an event loop
+        context = multiprocessing.get_context('fork')
+        ready = context.Event()
+        peer = context.Process(target=remote_echo, args=(hosts, bob, alice, total, ready))
+        peer.start()
+        try:
+            if not ready.wait(10):
+                raise CommandError("Peer process did not start")
+            return asyncio.run(ping(make_layer(mode, hosts), alice, bob, total, local_peer=False))
+        finally:
+            peer.join(10)
+            if peer.is_alive():
+                peer.kill()
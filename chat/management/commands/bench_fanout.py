@@ -0,0 +1,100 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chat import fanout
+from chat.models import Channel, Group
+
+
+class Command(BaseCommand):
+    help = (
+        "Load generator for group/channel fan-out: joins many simulated sockets to a room's "
+        "shard groups on the configured channel layer, publishes through chat/fanout.py and "
+        "reports publish cost and end-to-end delivery latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listeners', type=int, default=100000, help="Simulated sockets (ignored with --room)")
+        parser.add_argument('--room', help="Use the members/subscribers of this group or channel id, one socket each")
+        parser.add_argument('--kind', choices=['group', 'channel'], default='channel')
+        parser.add_argument('--shards', type=int, help="Override CHAT_FANOUT_SHARDS for this run (1 = unsharded)")
+        parser.add_argument('--messages', type=int, default=20, help="Keep below the layer's per-channel capacity")
+        parser.add_argument('--interval-ms', type=int, default=100, help="Pause between publishes")
+        parser.add_argument('--join-concurrency', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        room_id = options['room']
+        if room_id:
+            model = Group if kind == 'group' else Channel
+            if not model.objects.filter(id=room_id).exists():
+                raise CommandError(f"No {kind} {room_id}")
+            # Streamed in batches: the member list is never held as model instances
+            listeners = sum(len(batch) for batch in fanout.iter_member_ids(kind, room_id))
+        else:
+            room_id = str(uuid.uuid4())
+            listeners = options['listeners']
+
+        shards = options['shards'] or fanout.shard_count(kind)
+        with override_settings(CHAT_FANOUT_SHARDS={kind: shards}):
+            stats = asyncio.run(self.run(kind, room_id, listeners, options))
+
+        latencies, publish_times, elapsed = stats
+        expected = listeners * options['messages']
+        self.stdout.write(f"room:           {kind} {room_id}, {listeners} sockets in {shards} shard group(s)")
+        self.stdout.write(f"publishes:      {options['messages']}, "
+                          f"sender cost {statistics.mean(publish_times) * 1000:.2f}ms avg per message")
+        self.stdout.write(f"deliveries:     {len(latencies)}/{expected} in {elapsed:.2f}s "
+                          f"({len(latencies) / elapsed:,.0f}/s)")
+        if latencies:
+            latencies.sort()
+            pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+            self.stdout.write(f"latency (ms):   p50 {pct(0.50):.1f}  p95 {pct(0.95):.1f}  "
+                              f"p99 {pct(0.99):.1f}  max {latencies[-1] * 1000:.1f}")
+        if len(latencies) < expected:
+            self.stdout.write(self.style.WARNING("Some deliveries were lost (layer capacity or expiry)"))
+
+    async def run(self, kind, room_id, listeners, options):
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError("No channel layer configured")
+        messages = options['messages']
+        names = [await layer.new_channel() for _ in range(listeners)]
+
+        async def in_chunks(calls):
+            step = options['join_concurrency']
+            for i in range(0, len(calls), step):
+                await asyncio.gather(*calls[i:i + step])
+
+        await in_chunks([layer.group_add(fanout.member_group(kind, room_id, name), name) for name in names])
+        self.stdout.write(f"joined {listeners} sockets")
+
+        latencies = []
+
+        async def listen(name):
+            for _ in range(messages):
+                event = await layer.receive(name)
+                latencies.append(time.perf_counter() - event['sent_at'])
+
+        receivers = [asyncio.ensure_future(listen(name)) for name in names]
+        publish_times = []
+        start = time.perf_counter()
+        try:
+            for seq in range(messages):
+                sent_at = time.perf_counter()
+                await fanout.publish(layer, kind, room_id, {'type': 'chat.message', 'seq': seq}, sent_at=sent_at)
+                publish_times.append(time.perf_counter() - sent_at)
+                await asyncio.sleep(options['interval_ms'] / 1000)
+            # Give stragglers up to 30s once the last publish is out
+            await asyncio.wait(receivers, timeout=30)
+        finally:
+            elapsed = time.perf_counter() - start
+            for task in receivers:
+                task.cancel()
+            await in_chunks([layer.group_discard(fanout.member_group(kind, room_id, name), name) for name in names])
+        return latencies, publish_times, elapsed
@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import frames
+
+SAMPLE = {
+    'type': 'chat_message',
+    'message_id': '5f0c7a52-8d7c-4a55-9b0e-3f1f0f6f2a11',
+    'message': 'See you at the station at half past six, the later train is cancelled again',
+    'user_id': '1024',
+    'reply_to': None,
+    'file_url': None,
+    'is_media': False,
+    'timestamp': '2026-01-01T18:30:00.123456+00:00',
+    'timezone': 'Europe/Berlin',
+    'room_type': 'conversation',
+    'room_id': '0b7c4a3e-1e55-4f7e-9d2e-7a8c5e9b1c40',
+}
+INBOUND = json.dumps({'type': 'chat_message', 'message': SAMPLE['message'], 'client_id': 'c1700000000abc', 'reply_to': None})
+
+
+class Command(BaseCommand):
+    help = "Frames per second on one core: per-recipient json.dumps vs. encode-once broadcasts, and inbound decoding."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--broadcasts', type=int, default=20000)
+        parser.add_argument('--recipients', type=int, default=50, help="Sockets receiving each broadcast")
+        parser.add_argument('--inbound', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        broadcasts, recipients = options['broadcasts'], options['recipients']
+        sink = []
+        send = sink.append  # stands in for the socket write
+
+        def per_recipient_json():
+            # Old path: every consumer serialized the event for its own socket
+            for _ in range(broadcasts):
+                event = dict(SAMPLE)
+                for _ in range(recipients):
+                    send(json.dumps(event))
+                sink.clear()
+
+        def encode_once(codec):
+            def run():
+                for _ in range(broadcasts):
+                    event = frames.prepare(dict(SAMPLE))
+                    for _ in range(recipients):
+                        send(event[codec])
+                    sink.clear()
+            return run
+
+        total = broadcasts * recipients
+        self.stdout.write(f"outbound: {broadcasts} broadcasts x {recipients} recipients")
+        baseline = self.rate(per_recipient_json, total, "json.dumps per recipient")
+        self.rate(encode_once(frames.JSON), total, "encode once, JSON", baseline)
+        if frames.msgpack is not None:
+            self.rate(encode_once(frames.MSGPACK), total, "encode once, msgpack", baseline)
+
+        count = options['inbound']
+        packed = frames.msgpack.packb(json.loads(INBOUND)) if frames.msgpack is not None else None
+        accepts = ('chat_message',)
+        self.stdout.write(f"inbound: {count} frames")
+        baseline = self.rate(lambda: [json.loads(INBOUND) for _ in range(count)], count, "json.loads, unchecked")
+        self.rate(lambda: [frames.decode(INBOUND, None, accepts) for _ in range(count)], count,
+                  "decode + validate, JSON", baseline)
+        if packed is not None:
+            self.rate(lambda: [frames.decode(None, packed, accepts) for _ in range(count)], count,
+                      "decode + validate, msgpack", baseline)
+
+    def rate(self, func, frames_sent, label, baseline=None):
+        start = time.perf_counter()
+        func()
+        per_second = frames_sent / (time.perf_counter() - start)
+        line = f"  {label:<28} {per_second:>12,.0f} frames/s"
+        if baseline:
+            line += f"  ({per_second / baseline:.1f}x)"
+        self.stdout.write(line)
+        return per_second
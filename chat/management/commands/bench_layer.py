@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import random
+import time
+import uuid
+from contextlib import nullcontext
+
+from channels_redis.core import RedisChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layers import ShardedRedisChannelLayer
+
+from .redis_nodes import LocalRedisNodes
+
+
+def bench_worker(hosts, groups, seconds, payload):
+    """One load process: `groups` rooms with one listener each, every room posted to in a closed loop."""
+    return asyncio.run(_bench_worker(hosts, groups, seconds, payload))
+
+
+async def _bench_worker(hosts, groups, seconds, payload):
+    layer = ShardedRedisChannelLayer(hosts=hosts, capacity=1000)
+    names = [await layer.new_channel() for _ in range(groups)]
+    rooms = [f"chat_{uuid.uuid4()}" for _ in range(groups)]
+    for room, name in zip(rooms, names):
+        await layer.group_add(room, name)
+
+    delivered = 0
+    deadline = time.perf_counter() + seconds
+
+    async def listen(name):
+        nonlocal delivered
+        while True:
+            await layer.receive(name)
+            if time.perf_counter() < deadline:
+                delivered += 1
+
+    async def post(room):
+        while time.perf_counter() < deadline:
+            await layer.group_send(room, {'type': 'chat.message', 'message': payload})
+
+    listeners = [asyncio.ensure_future(listen(name)) for name in names]
+    await asyncio.gather(*(post(room) for room in rooms))
+    await asyncio.sleep(0.2)  # deliveries already queued before the deadline
+    for task in listeners:
+        task.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    for room, name in zip(rooms, names):
+        await layer.group_discard(room, name)
+    await layer.close_pools()
+    return delivered
+
+
+class Command(BaseCommand):
+    help = (
+        "Channel-layer throughput against 1..N Redis nodes (chat/layers.py): several load processes "
+        "group_send to their own rooms for a fixed time and count deliveries. Also reports how many "
+        "room groups move to another node when one node is added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='1,2,4', help="Comma-separated node counts to measure")
+        parser.add_argument('--urls', help="Comma-separated redis:// URLs of running nodes (default: start local ones)")
+        parser.add_argument('--base-port', type=int, default=7001)
+        parser.add_argument('--redis-server', default='redis-server')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                            help="Load processes; keep them from being the bottleneck")
+        parser.add_argument('--groups', type=int, default=50, help="Rooms (and listeners) per process")
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--payload-bytes', type=int, default=200)
+        parser.add_argument('--keys', type=int, default=100000, help="Room names used for the remapping report")
+
+    def handle(self, *args, **options):
+        counts = sorted({int(n) for n in options['shards'].split(',')})
+        if not counts or counts[0] < 1:
+            raise CommandError("--shards takes positive node counts")
+
+        self.report_remapping(counts[-1], options['keys'])
+
+        if options['urls']:
+            urls = options['urls'].split(',')
+            if len(urls) < counts[-1]:
+                raise CommandError(f"--shards needs {counts[-1]} nodes, --urls lists {len(urls)}")
+            nodes = nullcontext()
+        else:
+            nodes = LocalRedisNodes(counts[-1], options['base_port'], options['redis_server'])
+            urls = nodes.urls
+
+        payload = 'x' * options['payload_bytes']
+        processes = options['processes']
+        self.stdout.write(f"throughput: {processes} processes x {options['groups']} rooms, "
+                          f"{options['seconds']:g}s per run")
+        baseline = None
+        with nodes, multiprocessing.get_context('fork').Pool(processes) as pool:
+            for count in counts:
+                delivered = sum(pool.starmap(
+                    bench_worker, [(urls[:count], options['groups'], options['seconds'], payload)] * processes
+                ))
+                rate = delivered / options['seconds']
+                baseline = baseline or rate
+                self.stdout.write(f"  {count:>2} node(s)  {rate:>12,.0f} messages/s  ({rate / baseline:.2f}x)")
+
+    def report_remapping(self, nodes, keys):
+        """Share of room groups that change node when node nodes+1 joins, and ring balance."""
+        rng = random.Random(42)
+        names = [f"chat_{uuid.UUID(int=rng.getrandbits(128))}" for _ in range(keys)]
+        hosts = [f"redis://127.0.0.1:{7001 + i}" for i in range(nodes + 1)]
+
+        self.stdout.write(f"remapping: {keys} room groups, {nodes} -> {nodes + 1} nodes")
+        for label, layer_class in (("channels_redis ranges", RedisChannelLayer), ("hash ring", ShardedRedisChannelLayer)):
+            before = layer_class(hosts=hosts[:nodes]).consistent_hash
+            after = layer_class(hosts=hosts).consistent_hash
+            placed = [after(name) for name in names]
+            moved = sum(before(name) != node for name, node in zip(names, placed))
+            shares = [placed.count(i) / keys for i in range(nodes + 1)]
+            self.stdout.write(f"  {label:<22} {moved / keys:>6.1%} moved  "
+                              f"(ideal {1 / (nodes + 1):.1%}), node shares {min(shares):.1%}-{max(shares):.1%}")
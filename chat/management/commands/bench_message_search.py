@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chat.models import Conversation, Message
+from chat.search import search_messages
+
+User = get_user_model()
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'do', 'fi', 'gu', 'he', 'ja', 'wu']
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic message corpus and measure full-text search latency (PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--conversations', type=int, default=2000)
+        parser.add_argument('--visible-share', type=float, default=0.1,
+                            help="Fraction of conversations that belong to the searching user")
+        parser.add_argument('--vocabulary', type=int, default=4096)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated corpus")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        vocabulary = sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                             for _ in range(options['vocabulary'] * 2)})[:options['vocabulary']]
+
+        tag = uuid.uuid4().hex[:8]
+        searcher = User.objects.create(username=f'bench_s_{tag}', mobile=f's{tag}', email=f's{tag}@bench.local')
+        peers = User.objects.bulk_create([
+            User(username=f'bench_p{i}_{tag}', mobile=f'p{i}{tag}'[:15], email=f'p{i}{tag}@bench.local')
+            for i in range(options['conversations'])
+        ])
+        outsider = User.objects.create(username=f'bench_o_{tag}', mobile=f'o{tag}', email=f'o{tag}@bench.local')
+
+        visible = int(options['conversations'] * options['visible_share'])
+        conversations = Conversation.objects.bulk_create([
+            Conversation(initiator=searcher if i < visible else outsider, receiver=peer)
+            for i, peer in enumerate(peers)
+        ])
+        convo_ids = [str(c.id) for c in conversations]
+        sender_ids = [c.receiver_id for c in conversations]
+
+        try:
+            self.generate(options['messages'], convo_ids, sender_ids, vocabulary)
+            self.run_queries(searcher, vocabulary, options['queries'], rng)
+        finally:
+            if not options['keep']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {Message._meta.db_table} WHERE conversation_id = ANY(%s::uuid[])", [convo_ids])
+                Conversation.objects.filter(id__in=convo_ids).delete()
+                User.objects.filter(username__endswith=f'_{tag}').delete()
+
+    def generate(self, total, convo_ids, sender_ids, vocabulary, chunk=100_000):
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            for offset in range(0, total, chunk):
+                cursor.execute(f"""
+                    INSERT INTO {Message._meta.db_table}
+                        (id, conversation_id, sender_id, text, attachment, is_media, timestamp, is_forwarded)
+                    SELECT gen_random_uuid(),
+                           (%(convos)s::uuid[])[1 + g %% %(n)s],
+                           (%(senders)s::int[])[1 + g %% %(n)s],
+                           (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(nwords)s)::int], ' ')
+                              FROM generate_series(1, 3 + g %% 10) WHERE g > 0),
+                           '', false, now() - g * interval '1 second', false
+                      FROM generate_series(%(lo)s, %(hi)s) AS g
+                """, {
+                    'convos': convo_ids, 'senders': sender_ids, 'n': len(convo_ids),
+                    'words': vocabulary, 'nwords': len(vocabulary),
+                    'lo': offset + 1, 'hi': min(offset + chunk, total),
+                })
+                self.stdout.write(f"  inserted {min(offset + chunk, total):,} messages")
+            cursor.execute(f"ANALYZE {Message._meta.db_table}")
+        self.stdout.write(f"corpus ready in {time.perf_counter() - start:.1f}s")
+
+    def run_queries(self, user, vocabulary, count, rng):
+        kinds = {
+            'prefix (3 chars)': lambda: rng.choice(vocabulary)[:3],
+            'single term': lambda: rng.choice(vocabulary),
+            'two terms': lambda: f"{rng.choice(vocabulary)} {rng.choice(vocabulary)}",
+        }
+        for label, make_query in kinds.items():
+            timings, hits = [], 0
+            for _ in range(count):
+                start = time.perf_counter()
+                results, _ = search_messages(user, make_query())
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += len(results)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f"{label:18} p50 {statistics.median(timings):7.1f} ms   p95 {p95:7.1f} ms   "
+                f"max {timings[-1]:7.1f} ms   avg hits/page {hits / count:.1f}"
+            )
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chat.models import Conversation, Message
+from chat.persistence import MessageWriteBuffer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare per-message INSERTs with the write-behind batched path used by ChatConsumer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--clients', type=int, default=50, help="Concurrent senders for the batched run")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-delay-ms', type=int, default=5)
+
+    def handle(self, *args, **options):
+        total = options['messages']
+        tag = uuid.uuid4().hex[:8]
+        alice = User.objects.create(username=f'bench_a_{tag}', mobile=f'b{tag}a', email=f'{tag}a@bench.local')
+        bob = User.objects.create(username=f'bench_b_{tag}', mobile=f'b{tag}b', email=f'{tag}b@bench.local')
+        convo = Conversation.objects.create(initiator=alice, receiver=bob)
+
+        try:
+            # Old path: lookups + one INSERT + summary UPDATE per message
+            start = time.perf_counter()
+            for i in range(total):
+                sender = User.objects.get(id=alice.id)
+                conversation = Conversation.objects.get(id=convo.id)
+                msg = Message.objects.create(sender=sender, conversation=conversation, text=f"single {i}")
+                conversation.record_message(msg)
+            single = time.perf_counter() - start
+
+            buffer = MessageWriteBuffer(batch_size=options['batch_size'], max_delay_ms=options['max_delay_ms'])
+            clients = options['clients']
+
+            async def sender(client_no, count):
+                for i in range(count):
+                    await buffer.submit(Message(sender_id=alice.id, conversation_id=convo.id, text=f"batched {client_no}/{i}"))
+
+            async def run_batched():
+                per_client, extra = divmod(total, clients)
+                await asyncio.gather(*(sender(c, per_client + (c < extra)) for c in range(clients)))
+
+            start = time.perf_counter()
+            asyncio.run(run_batched())
+            batched = time.perf_counter() - start
+
+            stored = Message.objects.filter(conversation=convo).count()
+            self.stdout.write(f"messages per run:     {total} (stored {stored})")
+            self.stdout.write(f"per-message insert:   {total / single:10.0f} msg/s  ({single:.2f}s)")
+            self.stdout.write(f"write-behind batched: {total / batched:10.0f} msg/s  ({batched:.2f}s, "
+                              f"{clients} clients, batch {options['batch_size']}, {options['max_delay_ms']}ms)")
+            self.stdout.write(self.style.SUCCESS(f"speedup: {single / batched:.1f}x"))
+        finally:
+            convo.delete()
+            alice.delete()
+            bob.delete()
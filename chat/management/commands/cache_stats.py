@@ -0,0 +1,43 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import STATS_FIELDS, STATS_KEY, TieredRedisCache
+
+
+class Command(BaseCommand):
+    help = "Cache hit ratios per key prefix, summed over all workers (core/cache.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help="Cache alias")
+        parser.add_argument('--reset', action='store_true', help="Clear the counters after printing them")
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TieredRedisCache):
+            raise CommandError(f"Cache {options['alias']!r} is not a TieredRedisCache")
+        client = cache._cache.get_client(write=True)
+        raw = client.hgetall(STATS_KEY)
+        if options['reset']:
+            client.delete(STATS_KEY)
+        if not raw:
+            self.stdout.write("No cache reads recorded yet.")
+            return
+
+        counts = {}
+        for name, value in raw.items():
+            prefix, _, field = name.decode().rpartition('|')
+            counts.setdefault(prefix, dict.fromkeys(STATS_FIELDS, 0))[field] = int(value)
+
+        width = max(len(prefix) for prefix in counts)
+        self.stdout.write(f"{'prefix':<{width}}  {'reads':>10}  {'L1 hits':>10}  {'Redis hits':>10}  "
+                          f"{'misses':>10}  {'hit ratio':>9}  {'from L1':>7}")
+        for prefix in sorted(counts):
+            c = counts[prefix]
+            reads = sum(c.values())
+            hits = c['l1_hits'] + c['hits']
+            self.stdout.write(
+                f"{prefix:<{width}}  {reads:>10}  {c['l1_hits']:>10}  {c['hits']:>10}  {c['misses']:>10}  "
+                f"{hits / reads:>9.1%}  {c['l1_hits'] / reads:>7.1%}"
+            )
+        if options['reset']:
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
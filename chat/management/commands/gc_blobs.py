@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat import blobs
+from chat.models import Blob, Message
+
+
+class Command(BaseCommand):
+    help = "Garbage-collect unreferenced attachment blobs (normally done as messages are deleted)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute every ref_count from the messages table first")
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help="Move attachments stored before the blob store into it, deduplicating them")
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy']:
+            adopted = self.adopt_legacy()
+            self.stdout.write(f"Adopted {adopted} legacy attachment file(s).")
+        if options['recount']:
+            blobs.recount_refs()
+
+        collected = sum(blobs.collect(pk) for pk in Blob.objects.filter(ref_count=0).values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(f"Collected {collected} unreferenced blob(s)."))
+
+    def adopt_legacy(self):
+        legacy = Message.objects.filter(blob=None).exclude(attachment='').exclude(attachment=None)
+        adopted = 0
+        for name in legacy.values_list('attachment', flat=True).distinct().iterator():
+            if not default_storage.exists(name):
+                continue
+            with transaction.atomic():
+                blob = blobs.acquire_path(default_storage.path(name), name)
+                count = legacy.filter(attachment=name).update(blob=blob, attachment=blob.file.name)
+                blobs.add_refs(blob.pk, count - 1)  # acquire_path already took one
+            adopted += 1
+        return adopted
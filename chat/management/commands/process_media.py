@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import media
+from chat.models import Blob
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails and placeholders for pending image attachments (worker process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process what is pending and exit")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle")
+        parser.add_argument('--requeue', action='store_true',
+                            help="First put failed and interrupted (processing) blobs back to pending")
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            requeued = Blob.objects.filter(media_state__in=[Blob.MEDIA_PROCESSING, Blob.MEDIA_FAILED]).update(
+                media_state=Blob.MEDIA_PENDING
+            )
+            self.stdout.write(f"Requeued {requeued} blob(s).")
+
+        while True:
+            pending = list(Blob.objects.filter(media_state=Blob.MEDIA_PENDING).order_by('created_at')
+                           .values_list('pk', flat=True)[:100])
+            done = sum(media.process_blob(pk) for pk in pending)
+            if done:
+                self.stdout.write(f"Processed {done} image(s).")
+            if options['once']:
+                break
+            if not done:
+                time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.uploads import purge_stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned chunked uploads and their temp files (run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=getattr(settings, 'CHAT_UPLOAD_SESSION_TTL_HOURS', 24),
+                            help="Purge sessions with no chunk received for this long")
+
+    def handle(self, *args, **options):
+        count = purge_stale_sessions(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} upload session(s)."))
@@ -0,0 +1,96 @@
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class LocalRedisNodes:
+    """
+    Throwaway redis-server processes on consecutive ports (no persistence,
+    data in a temp dir), for sharding tests and bench_layer. Use as a context
+    manager; `urls` lists the nodes in port order.
+    """
+
+    def __init__(self, count, base_port=7001, redis_server='redis-server'):
+        self.binary = shutil.which(redis_server)
+        if self.binary is None:
+            raise CommandError(f"{redis_server} not found; install Redis or pass --redis-server")
+        self.ports = list(range(base_port, base_port + count))
+        self.urls = [f"redis://127.0.0.1:{port}" for port in self.ports]
+        self.processes = []
+        self.workdir = None
+
+    def __enter__(self):
+        self.workdir = tempfile.TemporaryDirectory(prefix='redis-nodes-')
+        try:
+            for port in self.ports:
+                self.processes.append(subprocess.Popen(
+                    [self.binary, '--port', str(port), '--bind', '127.0.0.1', '--save', '', '--appendonly', 'no',
+                     '--dir', self.workdir.name, '--logfile', f'{self.workdir.name}/{port}.log'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ))
+            for port in self.ports:
+                self.wait_for(port)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        if self.workdir is not None:
+            self.workdir.cleanup()
+            self.workdir = None
+
+    def wait_for(self, port, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=0.5) as conn:
+                    conn.sendall(b'PING\r\n')
+                    if conn.recv(16).startswith(b'+PONG'):
+                        return
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise CommandError(f"redis-server on port {port} did not start (port taken?)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run several local redis-server processes for the sharded channel layer (chat/layers.py) "
+        "until interrupted, and print the CHANNEL_REDIS_URLS value that points at them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=4)
+        parser.add_argument('--base-port', type=int, default=7001)
+        parser.add_argument('--redis-server', default='redis-server', help="redis-server binary")
+
+    def handle(self, *args, **options):
+        with LocalRedisNodes(options['nodes'], options['base_port'], options['redis_server']) as nodes:
+            self.stdout.write(self.style.SUCCESS(f"{len(nodes.urls)} Redis nodes up. In another shell:"))
+            self.stdout.write(f"  export CHANNEL_REDIS_URLS={','.join(nodes.urls)}")
+            self.stdout.write("Ctrl-C stops them.")
+            signal.signal(signal.SIGTERM, self.interrupt)
+            try:
+                while all(process.poll() is None for process in nodes.processes):
+                    time.sleep(1)
+                raise CommandError("A redis-server process exited")
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping.")
+
+    @staticmethod
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
@@ -0,0 +1,31 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from chat import state
+
+
+class Command(BaseCommand):
+    help = "Show the shared WebSocket counters (throttled, invalid and dropped frames/sockets) from all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Clear the counters after printing them")
+
+    def handle(self, *args, **options):
+        async def read():
+            client = state.get_redis()
+            counters = await client.hgetall(state.COUNTERS_KEY)
+            if options['reset']:
+                await client.delete(state.COUNTERS_KEY)
+            await client.aclose()
+            return counters
+
+        counters = asyncio.run(read())
+        if not counters:
+            self.stdout.write("No counters recorded yet.")
+            return
+        width = max(len(name) for name in counters)
+        for name in sorted(counters):
+            self.stdout.write(f"{name:<{width}}  {int(counters[name]):>10}")
+        if options['reset']:
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
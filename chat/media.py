@@ -0,0 +1,122 @@
+"""
+Image preview pipeline for attachment blobs.
+
+New image blobs are marked `pending` by chat/blobs.py and processed off the
+request path, either by a per-process thread pool (CHAT_MEDIA_PIPELINE =
+'thread', the default) or by `manage.py process_media` running as a separate
+worker ('worker'). Each image gets:
+
+    width / height   of the original, after EXIF rotation
+    thumbnail        a JPEG fitting THUMBNAIL_SIZE, shown in message lists
+    placeholder      a ~16px blurred JPEG data: URI, shown while the thumbnail loads
+
+Because blobs are content-addressed, each distinct image is processed once no
+matter how often it is re-uploaded or forwarded. Pillow is only needed by the
+process doing the work; without it, blobs stay pending for a worker that has it.
+"""
+import base64
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .models import Blob
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 80
+PLACEHOLDER_SIZE = (16, 16)
+PLACEHOLDER_QUALITY = 40
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CHAT_MEDIA_THREADS', 2), thread_name_prefix='chat-media'
+        )
+    return _executor
+
+
+def schedule(blob_id):
+    """Queue a pending blob once the current transaction commits (no-op in 'worker' mode)."""
+    if getattr(settings, 'CHAT_MEDIA_PIPELINE', 'thread') != 'thread':
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run_in_thread, blob_id))
+
+
+def _run_in_thread(blob_id):
+    try:
+        process_blob(blob_id)
+    finally:
+        close_old_connections()
+
+
+def _encode_jpeg(image, quality):
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def render_previews(fileobj):
+    """Returns (width, height, thumbnail JPEG bytes, placeholder data URI) for an image file."""
+    from PIL import Image, ImageOps
+
+    with Image.open(fileobj) as image:
+        original_size = image.size
+        # JPEG: let the decoder downscale by 1/2..1/8 instead of decoding every pixel
+        image.draft('RGB', (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        # Dimensions of the full original: draft() may have shrunk the decoded copy
+        scale = max(original_size) / max(image.size) if image.size != original_size else 1
+        width, height = round(image.width * scale), round(image.height * scale)
+
+        image.thumbnail(THUMBNAIL_SIZE)
+        thumbnail = _encode_jpeg(image, THUMBNAIL_QUALITY)
+
+        image.thumbnail(PLACEHOLDER_SIZE)
+        placeholder = 'data:image/jpeg;base64,' + base64.b64encode(_encode_jpeg(image, PLACEHOLDER_QUALITY)).decode()
+    return width, height, thumbnail, placeholder
+
+
+def process_blob(blob_id):
+    """Generate previews for one pending blob. Returns True if it ended up ready."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        logger.warning("Pillow is not installed; leaving blob %s pending", blob_id)
+        return False
+
+    # Claim it so concurrent workers never do the same image twice
+    if not Blob.objects.filter(pk=blob_id, media_state=Blob.MEDIA_PENDING).update(media_state=Blob.MEDIA_PROCESSING):
+        return False
+    blob = Blob.objects.filter(pk=blob_id).first()
+    if blob is None:
+        return False
+
+    try:
+        with default_storage.open(blob.file.name, 'rb') as f:
+            width, height, thumbnail, placeholder = render_previews(f)
+        thumb_name = default_storage.save(f"thumbs/{blob_id[:2]}/{blob_id}.jpg", ContentFile(thumbnail))
+    except Exception:
+        logger.exception("Could not generate previews for blob %s", blob_id)
+        Blob.objects.filter(pk=blob_id).update(media_state=Blob.MEDIA_FAILED)
+        return False
+
+    updated = Blob.objects.filter(pk=blob_id).update(
+        media_state=Blob.MEDIA_READY, width=width, height=height, thumbnail=thumb_name, placeholder=placeholder,
+    )
+    if not updated:
+        # The blob was garbage-collected meanwhile
+        default_storage.delete(thumb_name)
+    return bool(updated)
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    for convo in Conversation.objects.all().iterator():
+        last_msg = Message.objects.filter(conversation=convo).order_by('-timestamp').first()
+        if last_msg:
+            convo.last_message_text = last_msg.text[:255]
+            convo.last_message_at = last_msg.timestamp
+            convo.save(update_fields=['last_message_text', 'last_message_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_alter_message_conversation_channel_message_channel_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_text',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
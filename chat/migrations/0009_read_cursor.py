@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 04:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_read_cursors(apps, schema_editor):
+    """Watermark = newest message each participant had already marked is_read."""
+    Message = apps.get_model('chat', 'Message')
+    ReadCursor = apps.get_model('chat', 'ReadCursor')
+
+    rows = Message.objects.filter(is_read=True, conversation__isnull=False).values(
+        'conversation_id', 'conversation__initiator_id', 'conversation__receiver_id', 'sender_id'
+    ).annotate(read_at=models.Max('timestamp'))
+
+    watermarks = {}
+    for row in rows:
+        # The reader is whichever participant did not send the message
+        if row['sender_id'] == row['conversation__initiator_id']:
+            reader_id = row['conversation__receiver_id']
+        else:
+            reader_id = row['conversation__initiator_id']
+        if reader_id is None:
+            continue
+        key = (reader_id, row['conversation_id'])
+        if key not in watermarks or watermarks[key] < row['read_at']:
+            watermarks[key] = row['read_at']
+
+    ReadCursor.objects.bulk_create([
+        ReadCursor(user_id=user_id, conversation_id=conversation_id, last_read_at=read_at)
+        for (user_id, conversation_id), read_at in watermarks.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_page_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('conversation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.conversation')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('conversation__isnull', False)), fields=('user', 'conversation'), name='unique_read_cursor_conversation'), models.UniqueConstraint(condition=models.Q(('group__isnull', False)), fields=('user', 'group'), name='unique_read_cursor_group')],
+            },
+        ),
+        migrations.RunPython(backfill_read_cursors, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
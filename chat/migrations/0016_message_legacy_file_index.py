@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 04:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_blob_media_previews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('blob__isnull', True)), fields=['attachment'], name='chat_msg_legacy_file_idx'),
+        ),
+    ]
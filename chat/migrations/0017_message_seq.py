@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 05:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0016_message_legacy_file_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='last_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='last_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='delivered_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        # Number existing messages per room in (timestamp, id) order, as history pages show them
+        migrations.RunSQL(
+            [
+                f"""
+                UPDATE chat_message m SET seq = numbered.seq
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY {fk} ORDER BY timestamp, id) AS seq
+                    FROM chat_message WHERE {fk} IS NOT NULL
+                ) numbered
+                WHERE m.id = numbered.id
+                """
+                for fk in ('conversation_id', 'group_id', 'channel_id')
+            ] + [
+                f"""
+                UPDATE {table} r SET last_seq = counts.n
+                FROM (SELECT {fk} AS room_id, MAX(seq) AS n FROM chat_message WHERE {fk} IS NOT NULL GROUP BY {fk}) counts
+                WHERE r.id = counts.room_id
+                """
+                for table, fk in (('chat_conversation', 'conversation_id'), ('chat_group', 'group_id'), ('chat_channel', 'channel_id'))
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
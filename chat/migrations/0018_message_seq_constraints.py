@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0017 so the unique indexes are built after the backfill has committed
+
+    dependencies = [
+        ('chat', '0017_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('conversation', 'seq'), name='chat_msg_convo_seq_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('group', 'seq'), name='chat_msg_group_seq_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('channel', 'seq'), name='chat_msg_channel_seq_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0018_message_seq_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='list_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
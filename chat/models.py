@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models.functions import Cast, Upper
 import uuid
 from django.contrib.auth import get_user_model
 
@@ -16,6 +20,14 @@ class Contact(models.Model):
 
     class Meta:
         unique_together = ('owner', 'saved_user')
+        indexes = [
+            # Case-insensitive prefix lookup (name__istartswith) within one owner's phonebook
+            models.Index(
+                'owner',
+                OpClass(Upper(Cast('name', models.TextField())), name='text_pattern_ops'),
+                name='chat_contact_name_prefix_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.owner} -> {self.name}"
@@ -25,10 +37,36 @@ class Conversation(models.Model):
     initiator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="convo_starter")
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="convo_participant")
     start_time = models.DateTimeField(auto_now_add=True)
+
+    # Denormalized summary of the newest message (rendered by the chat list)
+    last_message_text = models.CharField(max_length=255, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_seq = models.BigIntegerField(default=0)  # seq of the newest message (see Message.allocate_seqs)
+    # Bumped whenever the summary changes; versions the chat list's cached rows (chat/chat_list.py)
+    list_version = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = (('initiator', 'receiver'),)
 
+    def record_message(self, message):
+        """Advance the last-message summary if `message` is the newest one."""
+        Conversation.objects.filter(pk=self.pk).filter(
+            models.Q(last_message_at__isnull=True) | models.Q(last_message_at__lte=message.timestamp)
+        ).update(
+            last_message_text=message.text[:255],
+            last_message_at=message.timestamp,
+            list_version=models.F('list_version') + 1,
+        )
+
+    def refresh_last_message(self):
+        """Recompute the summary from the newest remaining message (after deletes/edits)."""
+        last_msg = self.messages.order_by('-timestamp').only('text', 'timestamp').first()
+        Conversation.objects.filter(pk=self.pk).update(
+            last_message_text=last_msg.text[:255] if last_msg else '',
+            last_message_at=last_msg.timestamp if last_msg else None,
+            list_version=models.F('list_version') + 1,
+        )
+
 class Group(models.Model):
     """
     Represents a group chat with multiple members.
@@ -40,6 +78,7 @@ class Group(models.Model):
     members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="chat_groups")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    last_seq = models.BigIntegerField(default=0)
     
     class Meta:
         ordering = ('-updated_at',)
@@ -59,6 +98,7 @@ class Channel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_public = models.BooleanField(default=True)
+    last_seq = models.BigIntegerField(default=0)
     
     class Meta:
         ordering = ('-updated_at',)
@@ -66,6 +106,37 @@ class Channel(models.Model):
     def __str__(self):
         return self.name
 
+class Blob(models.Model):
+    """
+    A content-addressed attachment file, keyed by the SHA-256 of its bytes and
+    shared by every message carrying the same content (re-uploads, forwards).
+    ref_count is the number of messages pointing at it; chat/blobs.py removes
+    the row and the file when it drops to zero.
+    """
+    MEDIA_NONE, MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_READY, MEDIA_FAILED = 'none', 'pending', 'processing', 'ready', 'failed'
+    MEDIA_STATES = [(s, s) for s in (MEDIA_NONE, MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_READY, MEDIA_FAILED)]
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='blobs/')
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Image previews, filled in off the request path by chat/media.py
+    media_state = models.CharField(max_length=10, choices=MEDIA_STATES, default=MEDIA_NONE)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(upload_to='thumbs/', blank=True, null=True)
+    placeholder = models.TextField(blank=True)  # tiny blurred JPEG as a data: URI, inlined in the page
+
+    def __str__(self):
+        return f"{self.sha256[:12]} x{self.ref_count}"
+
+class MessageManager(models.Manager):
+    def get_queryset(self):
+        # The tsvector is only read by search filters, never by Python code
+        return super().get_queryset().defer('search_vector')
+
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     conversation = models.ForeignKey('Conversation', on_delete=models.CASCADE, related_name="messages", blank=True, null=True)
@@ -75,17 +146,167 @@ class Message(models.Model):
     text = models.TextField(blank=True)
     
     # Media/Files
-    attachment = models.FileField(upload_to='uploads/', blank=True, null=True)
+    attachment = models.FileField(upload_to='uploads/', blank=True, null=True)  # same name as blob.file when set
+    blob = models.ForeignKey('Blob', on_delete=models.PROTECT, related_name="messages", blank=True, null=True)
     is_media = models.BooleanField(default=False) # True if image/video
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # buffered writes keep the time the message was sent
+    # Position in its room, 1, 2, 3... in commit order; clients resume from the last one they saw
+    seq = models.BigIntegerField(null=True, blank=True, editable=False)
     
     # Features
     reply_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='replies')
     is_forwarded = models.BooleanField(default=False)
-    
-    # Read Status
-    is_read = models.BooleanField(default=False)
+
+    # Full-text search (chat/search.py); computed by PostgreSQL on every write
+    search_vector = models.GeneratedField(
+        expression=SearchVector('text', config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = MessageManager()
 
     class Meta:
-        ordering = ('timestamp',)
\ No newline at end of file
+        ordering = ('timestamp',)
+        indexes = [
+            # Keyset pagination of history: WHERE <fk> = ? AND (timestamp, id) < (?, ?)
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='chat_msg_convo_page_idx'),
+            models.Index(fields=['group', 'timestamp', 'id'], name='chat_msg_group_page_idx'),
+            models.Index(fields=['channel', 'timestamp', 'id'], name='chat_msg_channel_page_idx'),
+            GinIndex(fields=['search_vector'], name='chat_msg_search_gin_idx'),
+            # Media access checks for attachments stored before the blob store (see gc_blobs --adopt-legacy)
+            models.Index(fields=['attachment'], name='chat_msg_legacy_file_idx', condition=models.Q(blob__isnull=True)),
+        ]
+        constraints = [
+            # Also the index for sync: WHERE <fk> = ? AND seq > ? ORDER BY seq
+            models.UniqueConstraint(fields=['conversation', 'seq'], condition=models.Q(seq__isnull=False), name='chat_msg_convo_seq_uniq'),
+            models.UniqueConstraint(fields=['group', 'seq'], condition=models.Q(seq__isnull=False), name='chat_msg_group_seq_uniq'),
+            models.UniqueConstraint(fields=['channel', 'seq'], condition=models.Q(seq__isnull=False), name='chat_msg_channel_seq_uniq'),
+        ]
+
+    ROOM_KINDS = ('conversation', 'group', 'channel')
+
+    @property
+    def room_key(self):
+        """(kind, room id) of the conversation, group or channel this message is in."""
+        for kind in self.ROOM_KINDS:
+            room_id = getattr(self, f'{kind}_id')
+            if room_id:
+                return kind, room_id
+        return None, None
+
+    @classmethod
+    def allocate_seqs(cls, messages):
+        """
+        Number unsaved `messages` within their rooms, in list order. Must run in
+        the transaction that inserts them: the room's counter row stays locked
+        until commit, so seqs become visible in order and are never reused.
+        """
+        per_room = {}
+        for m in messages:
+            per_room.setdefault(m.room_key, []).append(m)
+        # Rooms are locked in a fixed order so concurrent batches cannot deadlock
+        rooms = sorted((key for key in per_room if key[0]), key=lambda key: (key[0], str(key[1])))
+        with connection.cursor() as cursor:
+            for kind, room_id in rooms:
+                room_messages = per_room[kind, room_id]
+                table = cls._meta.get_field(kind).related_model._meta.db_table
+                cursor.execute(
+                    f"UPDATE {table} SET last_seq = last_seq + %s WHERE id = %s RETURNING last_seq",
+                    [len(room_messages), room_id],
+                )
+                row = cursor.fetchone()
+                if row is None:  # room deleted; the INSERT will fail on its foreign key
+                    continue
+                for seq, m in enumerate(room_messages, start=row[0] - len(room_messages) + 1):
+                    m.seq = seq
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.seq is None:
+            with transaction.atomic():
+                Message.allocate_seqs([self])
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+class ReadCursor(models.Model):
+    """
+    A user's "last read" watermark in a conversation, group or channel.
+    Messages newer than last_read_at (from other senders) are unread.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="read_cursors")
+    conversation = models.ForeignKey('Conversation', on_delete=models.CASCADE, related_name="read_cursors", blank=True, null=True)
+    group = models.ForeignKey('Group', on_delete=models.CASCADE, related_name="read_cursors", blank=True, null=True)
+    channel = models.ForeignKey('Channel', on_delete=models.CASCADE, related_name="read_cursors", blank=True, null=True)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    delivered_seq = models.BigIntegerField(default=0)  # highest seq a client of the user acked
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], condition=models.Q(conversation__isnull=False), name='unique_read_cursor_conversation'),
+            models.UniqueConstraint(fields=['user', 'group'], condition=models.Q(group__isnull=False), name='unique_read_cursor_group'),
+            models.UniqueConstraint(fields=['user', 'channel'], condition=models.Q(channel__isnull=False), name='unique_read_cursor_channel'),
+        ]
+
+    @classmethod
+    def advance(cls, user, read_at, conversation=None, group=None, channel=None):
+        """
+        Move the watermark forward to `read_at` (never backwards): one UPDATE, or
+        one INSERT the first time. True if it moved.
+        """
+        updated = cls.objects.filter(user=user, conversation=conversation, group=group, channel=channel).filter(
+            models.Q(last_read_at__isnull=True) | models.Q(last_read_at__lt=read_at)
+        ).update(last_read_at=read_at)
+        if updated:
+            return True
+        _, created = cls.objects.get_or_create(
+            user=user, conversation=conversation, group=group, channel=channel,
+            defaults={'last_read_at': read_at},
+        )
+        return created
+
+    @classmethod
+    def advance_delivered(cls, user, seq, conversation=None, group=None, channel=None):
+        """Move the delivery watermark forward to `seq`; True if it moved."""
+        updated = cls.objects.filter(
+            user=user, conversation=conversation, group=group, channel=channel, delivered_seq__lt=seq
+        ).update(delivered_seq=seq)
+        if updated:
+            return True
+        _, created = cls.objects.get_or_create(
+            user=user, conversation=conversation, group=group, channel=channel,
+            defaults={'delivered_seq': seq},
+        )
+        return created
+
+    @classmethod
+    def last_read_at_for(cls, user, conversation=None, group=None, channel=None):
+        """The user's watermark, or None if they never opened the chat."""
+        return cls.objects.filter(user=user, conversation=conversation, group=group, channel=channel).values_list(
+            'last_read_at', flat=True
+        ).first()
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked attachment upload (chat/uploads.py). Chunks are appended
+    in order to a temp file under MEDIA_ROOT; the Message is created on commit.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    conversation = models.ForeignKey('Conversation', on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Chunks 0..received_chunks-1 are on disk; the next PUT must be chunk `received_chunks`
+    received_chunks = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def is_complete(self):
+        return self.received_chunks >= self.total_chunks
@@ -0,0 +1,163 @@
+"""
+Write-behind persistence for chat messages arriving over WebSockets.
+
+Consumers hand unsaved Message instances to the per-process buffer, which
+coalesces them into a single bulk_create per batch. A batch is flushed when it
+reaches CHAT_WRITE_BATCH_SIZE messages or CHAT_WRITE_MAX_DELAY_MS after its
+first message, whichever comes first. Message ids are UUIDs generated in
+Python, so they are known (and can be broadcast) before the row exists; the
+per-room seq (Message.allocate_seqs) is only assigned in the batch transaction.
+
+Consumers authorize the sender and room at connect time, so a batch is written
+without per-message lookups. Once it is committed, the participants of its
+conversations get a `conversation_updated` frame each (chat/chat_list.py).
+
+Without CHAT_WRITE_DURABLE messages are broadcast before they are stored, so
+the live frames carry no seq. Each room then gets one `message_seqs` frame
+per batch, [[message id, seq], ...], which lets clients place those messages
+in the room's sequence and notice a gap (a live frame the channel layer lost)
+without waiting for a reconnect.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import fanout
+from .chat_list import conversation_updates, publish_conversation_updates
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBuffer:
+    def __init__(self, batch_size=None, max_delay_ms=None):
+        self.batch_size = batch_size or getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 100)
+        delay_ms = max_delay_ms if max_delay_ms is not None else getattr(settings, 'CHAT_WRITE_MAX_DELAY_MS', 5)
+        self.max_delay = delay_ms / 1000
+        self._pending = []  # [(Message, Future)]
+        self._timer = None
+
+    async def submit(self, message):
+        """Queue an unsaved Message and wait until its batch is committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.batch_size:
+            loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, lambda: loop.create_task(self.flush()))
+
+        return await future
+
+    async def flush(self):
+        """Write everything queued so far in one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            rejected, updates = await database_sync_to_async(self.store_batch)([msg for msg, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for msg, future in batch:
+            if future.done():
+                continue
+            if msg.id in rejected:
+                future.set_exception(IntegrityError(f"Cannot store message {msg.id}"))
+            else:
+                future.set_result(msg)
+
+        channel_layer = get_channel_layer()
+        stored = [msg for msg, _ in batch if msg.id not in rejected]
+        try:
+            await asyncio.gather(
+                publish_conversation_updates(channel_layer, updates),
+                publish_seqs(channel_layer, stored),
+            )
+        except Exception:
+            logger.warning("Could not publish chat list updates or message seqs", exc_info=True)
+
+    @classmethod
+    def store_batch(cls, messages):
+        """write_batch(), plus the chat list updates for the messages that were stored."""
+        rejected = cls.write_batch(messages)
+        return rejected, conversation_updates([m for m in messages if m.id not in rejected])
+
+    @classmethod
+    def write_batch(cls, messages):
+        """
+        Store a batch and return the ids of messages that could not be stored.
+        The fast path is a single INSERT; if the batch violates a constraint
+        (e.g. a room deleted mid-socket) it is retried row by row so only the
+        offending messages fail.
+        """
+        reply_ids = {m.reply_to_id for m in messages if m.reply_to_id}
+        if reply_ids:
+            # Dangling reply references are dropped rather than failing the row
+            known_replies = {m.id for m in messages}
+            known_replies.update(Message.objects.filter(id__in=reply_ids).values_list('id', flat=True))
+            for m in messages:
+                if m.reply_to_id and m.reply_to_id not in known_replies:
+                    m.reply_to_id = None
+
+        try:
+            cls._insert(messages)
+            return set()
+        except IntegrityError:
+            rejected = set()
+            for m in messages:
+                try:
+                    cls._insert([m])
+                except IntegrityError:
+                    rejected.add(m.id)
+            return rejected
+
+    @staticmethod
+    def _insert(messages):
+        """One seq UPDATE per room, one bulk INSERT, then one last-message summary UPDATE per conversation."""
+        with transaction.atomic():
+            Message.allocate_seqs(messages)
+            Message.objects.bulk_create(messages)
+
+            newest = {}
+            for m in messages:
+                if m.conversation_id:  # group/channel messages have no summary row
+                    newest[m.conversation_id] = m
+            for convo_id, m in newest.items():
+                Conversation(pk=convo_id).record_message(m)
+
+
+async def publish_seqs(channel_layer, messages):
+    """One `message_seqs` frame per room for stored `messages` that were broadcast without their seq."""
+    if channel_layer is None or getattr(settings, 'CHAT_WRITE_DURABLE', False):
+        return
+    rooms = {}
+    for msg in messages:
+        rooms.setdefault(msg.room_key, []).append([str(msg.id), msg.seq])
+    await asyncio.gather(*(
+        fanout.publish(channel_layer, kind, room_id, {'type': 'message_seqs', 'seqs': seqs})
+        for (kind, room_id), seqs in rooms.items()
+    ))
+
+
+_buffer = None
+
+def get_write_buffer():
+    """The per-process buffer shared by every consumer in this worker."""
+    global _buffer
+    if _buffer is None:
+        _buffer = MessageWriteBuffer()
+    return _buffer
@@ -0,0 +1,131 @@
+"""
+Online presence and typing indicators, kept in Redis so every ASGI process
+sees the same state.
+
+    presence:conns:<user_id>            sorted set of the user's open sockets, scored
+                                        by expiry; heartbeats push the score forward,
+                                        so sockets of a crashed process age out alone
+    presence:seen:<user_id>             last-seen time (epoch seconds) once the last
+                                        socket closes
+    presence:typing:<room_id>:<user_id> set NX with CHAT_TYPING_TTL: only the first
+                                        `typing` frame of a window is broadcast, the
+                                        rest are coalesced away
+
+Changes are published to small groups instead of to everyone who might care:
+presence_group(user) is only joined by sockets that have a chat with that user
+open, and typing goes to viewers_group(room), the sockets showing that room.
+Presence traffic therefore grows with open chats, not with total connections.
+
+Presence is best effort: if Redis is unreachable the calls log and return
+"offline / nothing to broadcast" rather than breaking the chat itself.
+"""
+import functools
+import logging
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from . import state
+
+logger = logging.getLogger(__name__)
+
+
+def presence_ttl():
+    return getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+
+
+def typing_ttl():
+    return getattr(settings, 'CHAT_TYPING_TTL', 5)
+
+
+def presence_group(user_id):
+    return f"presence_{user_id}"
+
+
+def viewers_group(room_id):
+    return f"viewers_{room_id}"
+
+
+def _best_effort(default):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except (RedisError, OSError):
+                logger.warning("Presence store unavailable in %s", func.__name__, exc_info=True)
+                return default
+        return wrapper
+    return decorator
+
+
+def _touch(pipe, user_id, channel_name, now):
+    key = f"presence:conns:{user_id}"
+    pipe.zadd(key, {channel_name: now + presence_ttl()})
+    pipe.zremrangebyscore(key, '-inf', now)
+    pipe.zcard(key)
+    pipe.expire(key, presence_ttl())
+
+
+@_best_effort(False)
+async def connect(user_id, channel_name):
+    """Register a socket. True if the user just came online (no other live socket)."""
+    now = time.time()
+    async with state.get_redis().pipeline(transaction=True) as pipe:
+        _touch(pipe, user_id, channel_name, now)
+        _, _, sockets, _ = await pipe.execute()
+    return sockets == 1
+
+
+@_best_effort(False)
+async def heartbeat(user_id, channel_name):
+    """
+    Keep a socket alive for another CHAT_PRESENCE_TTL seconds. True if it had
+    already expired and the user is back online because of it.
+    """
+    async with state.get_redis().pipeline(transaction=True) as pipe:
+        _touch(pipe, user_id, channel_name, time.time())
+        added, _, sockets, _ = await pipe.execute()
+    return bool(added) and sockets == 1
+
+
+@_best_effort(None)
+async def disconnect(user_id, channel_name):
+    """
+    Drop a socket. Returns the last-seen time if that was the user's last one
+    (they went offline), else None.
+    """
+    now = time.time()
+    key = f"presence:conns:{user_id}"
+    async with state.get_redis().pipeline(transaction=True) as pipe:
+        pipe.zrem(key, channel_name)
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zcard(key)
+        _, _, sockets = await pipe.execute()
+    if sockets:
+        return None
+    await state.get_redis().set(f"presence:seen:{user_id}", int(now))
+    return int(now)
+
+
+@_best_effort({'online': False, 'last_seen': None})
+async def status(user_id):
+    """{'online': bool, 'last_seen': epoch seconds or None} for one user."""
+    async with state.get_redis().pipeline(transaction=False) as pipe:
+        pipe.zcount(f"presence:conns:{user_id}", time.time(), '+inf')
+        pipe.get(f"presence:seen:{user_id}")
+        sockets, seen = await pipe.execute()
+    return {'online': bool(sockets), 'last_seen': int(seen) if seen else None}
+
+
+@_best_effort(False)
+async def typing(room_id, user_id, active=True):
+    """
+    Record a typing start/stop. True if it should be broadcast: the first start
+    within CHAT_TYPING_TTL, or a stop for a start that was broadcast.
+    """
+    key = f"presence:typing:{room_id}:{user_id}"
+    if active:
+        return bool(await state.get_redis().set(key, 1, ex=typing_ttl(), nx=True))
+    return bool(await state.get_redis().delete(key))
@@ -0,0 +1,104 @@
+"""
+Token-bucket limits for inbound WebSocket frames.
+
+Every frame type draws from two buckets at once (CHAT_RATE_LIMITS, falling
+back to its 'default' entry):
+
+    ratelimit:conn:<channel name>:<type>   this socket
+    ratelimit:user:<user id>:<type>        all of the user's sockets, on every worker
+
+Both live in Redis and are checked and debited by one Lua script, so a frame
+costs a single round trip, and a frame is only charged when both buckets have
+a token. Refused frames are counted in the shared counters hash
+(chat/state.py) as `throttled:<scope>:<type>` by the same script.
+
+Rate limiting fails open: if Redis is unreachable the frame is allowed.
+"""
+import logging
+import weakref
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from . import state
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {'connection': (10, 30), 'user': (20, 60)}
+
+# KEYS: connection bucket, user bucket, counters hash
+# ARGV: connection rate, connection burst, user rate, user burst, frame type
+# Returns 0 if allowed, 1 if refused by the connection bucket, 2 by the user bucket
+_TAKE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local function level(key, rate, burst)
+    local b = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(b[1]) or burst
+    local ts = tonumber(b[2]) or now
+    return math.min(burst, tokens + math.max(now - ts, 0) * rate)
+end
+
+local function store(key, tokens, rate, burst)
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+
+local conn_rate, conn_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local user_rate, user_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local conn = level(KEYS[1], conn_rate, conn_burst)
+local user = level(KEYS[2], user_rate, user_burst)
+
+local refused = 0
+if conn < 1 then
+    refused = 1
+elseif user < 1 then
+    refused = 2
+else
+    conn = conn - 1
+    user = user - 1
+end
+store(KEYS[1], conn, conn_rate, conn_burst)
+store(KEYS[2], user, user_rate, user_burst)
+
+if refused == 1 then
+    redis.call('HINCRBY', KEYS[3], 'throttled:connection:' .. ARGV[5], 1)
+elseif refused == 2 then
+    redis.call('HINCRBY', KEYS[3], 'throttled:user:' .. ARGV[5], 1)
+end
+return refused
+"""
+
+SCOPES = {1: 'connection', 2: 'user'}
+
+_scripts = weakref.WeakKeyDictionary()  # {Redis client: registered script}, run by EVALSHA
+
+
+def _take_script(client):
+    script = _scripts.get(client)
+    if script is None:
+        script = _scripts[client] = client.register_script(_TAKE)
+    return script
+
+
+def limits_for(frame_type):
+    limits = getattr(settings, 'CHAT_RATE_LIMITS', {})
+    return limits.get(frame_type) or limits.get('default') or DEFAULT_LIMITS
+
+
+async def take(user_id, channel_name, frame_type):
+    """None if the frame may go through, else the scope that refused it ('connection' or 'user')."""
+    limits = limits_for(frame_type)
+    conn_rate, conn_burst = limits['connection']
+    user_rate, user_burst = limits['user']
+    try:
+        client = state.get_redis()
+        refused = await _take_script(client)(
+            keys=[f"ratelimit:conn:{channel_name}:{frame_type}", f"ratelimit:user:{user_id}:{frame_type}", state.COUNTERS_KEY],
+            args=[conn_rate, conn_burst, user_rate, user_burst, frame_type],
+        )
+    except (RedisError, OSError):
+        logger.warning("Rate limit store unavailable; allowing %s frame", frame_type)
+        return None
+    return SCOPES.get(int(refused))
@@ -4,4 +4,8 @@ from . import consumers
 websocket_urlpatterns = [
     # Matches ws://domain/ws/chat/UUID/
     re_path(r'ws/chat/(?P<room_id>[0-9a-f-]+)/$', consumers.ChatConsumer.as_asgi()),
+    # One multiplexed socket per user for live updates across all their rooms
+    re_path(r'ws/user/$', consumers.UserConsumer.as_asgi()),
+    # Live groups and channels, sharded for large audiences (chat/fanout.py)
+    re_path(r'ws/(?P<kind>group|channel)/(?P<room_id>[0-9a-f-]+)/$', consumers.RoomConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Message search across the user's chats, groups and joined channels, backed by the
+`Message.search_vector` tsvector column and its GIN index, plus the bounded
+search-as-you-type lookup for contacts and the user directory.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from .models import Contact
+from .utils import searchable_messages
+
+User = get_user_model()
+
+SEARCH_PAGE_SIZE = 20
+
+# Most matches a lookup returns, so its cost does not grow with the user table
+LOOKUP_LIMIT = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_prefix_query(text):
+    """
+    tsquery matching every word of `text`, the last one as a prefix so results
+    show up while the user is still typing. Returns None if there are no words.
+    """
+    terms = _TERM_RE.findall(text.lower())[:8]
+    if not terms:
+        return None
+    tsquery = ' & '.join(f"{term}:*" if i == len(terms) - 1 else term for i, term in enumerate(terms))
+    return SearchQuery(tsquery, config='simple', search_type='raw')
+
+
+def search_messages(user, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Ranked page of messages matching `text`. Returns (messages, has_next).
+    Uses LIMIT page_size + 1 instead of a COUNT so deep result sets stay cheap.
+    """
+    query = build_prefix_query(text)
+    if query is None:
+        return [], False
+
+    offset = (max(page, 1) - 1) * page_size
+    results = list(
+        searchable_messages(user)
+        .filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .select_related('sender', 'conversation__initiator', 'conversation__receiver', 'group', 'channel')
+        .order_by('-rank', '-timestamp')[offset:offset + page_size + 1]
+    )
+    return results[:page_size], len(results) > page_size
+
+
+# --- CONTACT / USER LOOKUP ---
+#
+# Lookups are case-insensitive prefix matches. Each branch is a range scan on a
+# prefix index (see Contact.Meta and CustomUser.Meta) that stops after `limit`
+# rows; there is no ORDER BY, which would force every match to be read and sorted.
+
+def lookup_contacts(user, text, limit=LOOKUP_LIMIT):
+    """The user's saved contacts whose name or mobile starts with `text`."""
+    text = text.strip()
+    if not text:
+        return []
+    by_name = Contact.objects.filter(owner=user, name__istartswith=text)
+    by_mobile = Contact.objects.filter(owner=user, saved_user__mobile__startswith=text)
+    return _first_matches([by_name, by_mobile], limit, related=('saved_user',))
+
+
+def lookup_users(user, text, limit=LOOKUP_LIMIT):
+    """Other registered users whose username or mobile starts with `text`."""
+    text = text.strip()
+    if not text:
+        return []
+    others = User.objects.exclude(id=user.id)
+    by_username = others.filter(username__istartswith=text)
+    by_mobile = others.filter(mobile__startswith=text)
+    return _first_matches([by_username, by_mobile], limit)
+
+
+def _first_matches(querysets, limit, related=()):
+    """Up to `limit` distinct rows taken from each queryset in turn."""
+    found = {}
+    for queryset in querysets:
+        if len(found) >= limit:
+            break
+        for obj in queryset.select_related(*related).order_by()[:limit]:
+            found.setdefault(obj.pk, obj)
+    return list(found.values())[:limit]
@@ -0,0 +1,115 @@
+"""
+File responses for authenticated media: conditional GET (ETag / If-None-Match),
+single byte ranges so audio and video can seek, and optional hand-off of the
+transfer to the front proxy so Python workers never stream file bytes.
+
+CHAT_MEDIA_ACCEL selects the hand-off:
+    ''                  Django streams the file itself
+    'x-accel-redirect'  nginx; CHAT_MEDIA_ACCEL_PREFIX is an `internal` location
+                        aliased to MEDIA_ROOT, e.g. /protected-media/
+    'x-sendfile'        Apache mod_xsendfile / lighttpd; the header is the file path
+The proxy then handles Range itself; the ETag check still happens here first.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_READ_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range `Range` header, None to serve the
+    whole file (no header, or a form we do not handle such as multiple ranges),
+    or False if the range cannot be satisfied.
+    """
+    match = _RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    if size == 0:
+        return False  # an empty file has no bytes to select
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _etag_matches(header, etag):
+    return header.strip() == '*' or etag in (tag.strip() for tag in header.split(','))
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(_READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_file(request, name, etag=None, filename=None, immutable=False):
+    """Response for the storage file `name`; `etag` defaults to one built from size and mtime."""
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+    etag = f'"{etag}"' if etag else f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': etag,
+        # Private: every response depends on who is asking
+        'Cache-Control': 'private, max-age=31536000, immutable' if immutable else 'private, no-cache',
+        'Accept-Ranges': 'bytes',
+    }
+    if filename:
+        headers['Content-Disposition'] = content_disposition_header(False, filename)
+
+    if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+        return HttpResponse(status=304, headers=headers)
+
+    accel = getattr(settings, 'CHAT_MEDIA_ACCEL', '')
+    if accel == 'x-accel-redirect':
+        headers['X-Accel-Redirect'] = getattr(settings, 'CHAT_MEDIA_ACCEL_PREFIX', '/protected-media/') + name
+        return HttpResponse(content_type=content_type, headers=headers)
+    if accel == 'x-sendfile':
+        headers['X-Sendfile'] = path
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        byte_range = None  # the client's cached part is stale: send it all
+    else:
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+
+    if byte_range is False:
+        headers['Content-Range'] = f"bytes */{stat.st_size}"
+        return HttpResponse(status=416, headers=headers)
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    headers['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+    headers['Content-Length'] = str(length)
+    return StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type, headers=headers)
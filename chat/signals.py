@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from . import blobs
+from .models import Message
+
+
+@receiver(post_delete, sender=Message)
+def release_attachment_blob(sender, instance, **kwargs):
+    # Runs for single deletes, queryset deletes and cascades from chats/groups/channels
+    if instance.blob_id:
+        blobs.release(instance.blob_id)
@@ -0,0 +1,39 @@
+"""
+Shared Redis state for the WebSocket layer: the connection used by presence
+(chat/presence.py) and rate limits (chat/ratelimit.py), and the counters
+they record for tuning, kept in one hash so they add up across all workers.
+
+    manage.py ws_counters   prints them (--reset clears them)
+"""
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_KEY = 'metrics:ws'
+
+_clients = weakref.WeakKeyDictionary()  # {event loop: Redis}
+
+
+def get_redis():
+    """Client for the running event loop (redis.asyncio connections are bound to their loop)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = aioredis.Redis.from_url(
+            getattr(settings, 'CHAT_REDIS_URL', 'redis://127.0.0.1:6379/0'), decode_responses=True
+        )
+    return client
+
+
+async def incr_counter(name, amount=1):
+    """Best-effort increment of a shared counter."""
+    try:
+        await get_redis().hincrby(COUNTERS_KEY, name, amount)
+    except (RedisError, OSError):
+        logger.warning("Could not record counter %s", name)
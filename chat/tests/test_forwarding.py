@@ -0,0 +1,52 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from chat.forwarding import ForwardError, forward_messages
+from chat.models import Conversation, Message
+
+User = get_user_model()
+
+
+class ForwardValidationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='bob', email='bob@example.com')
+        self.chat = Conversation.objects.create(initiator=self.alice, receiver=self.bob)
+        self.msg = Message.objects.create(conversation=self.chat, sender=self.alice, text='hi')
+
+    def post(self, name, payload):
+        self.client.force_login(self.alice)
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_malformed_target_id_is_a_bad_request(self):
+        with self.assertRaises(ForwardError) as raised:
+            forward_messages(self.alice, [self.msg.id], [('conversation', 'not-a-uuid')])
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_malformed_ids_in_requests_answer_400(self):
+        response = self.post('bulk_forward_messages', {
+            'message_ids': ['nope'], 'targets': [{'type': 'conversation', 'id': str(self.chat.id)}],
+        })
+        self.assertEqual(response.status_code, 400)
+        response = self.post('forward_message', {'message_id': str(self.msg.id), 'target_chat_id': '42'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_foreign_target_is_forbidden(self):
+        carol = User.objects.create_user(mobile='300', username='carol', email='carol@example.com')
+        other = Conversation.objects.create(initiator=self.bob, receiver=carol)
+        with self.assertRaises(ForwardError) as raised:
+            forward_messages(self.alice, [self.msg.id], [('conversation', other.id)])
+        self.assertEqual(raised.exception.status, 403)
+
+    def test_copies_share_a_timestamp_and_keep_the_source_order(self):
+        later = Message.objects.create(conversation=self.chat, sender=self.bob, text='second')
+        target = Conversation.objects.create(initiator=self.alice, receiver=self.alice)
+        copies = forward_messages(self.alice, [later.id, self.msg.id], [('conversation', target.id)])
+        self.assertEqual(len({copy.timestamp for copy in copies}), 1)
+        self.assertEqual(
+            [m.text for m in Message.objects.filter(conversation=target).order_by('timestamp', 'id')],
+            ['[Forwarded]: hi', '[Forwarded]: second'],
+        )
@@ -0,0 +1,105 @@
+import json
+from unittest import mock
+
+import msgpack
+from django.test import SimpleTestCase, override_settings
+
+from chat import frames
+from chat.frames import JSON, MSGPACK, FrameError, FrameSpec
+
+ROOM_FRAMES = ('chat_message', 'mark_read', 'sync', 'ack', 'heartbeat')
+
+
+class NegotiationTests(SimpleTestCase):
+    def test_first_supported_subprotocol_wins(self):
+        self.assertEqual(frames.negotiate(['chat.msgpack', 'chat.json']), (MSGPACK, 'chat.msgpack'))
+        self.assertEqual(frames.negotiate(['graphql-ws', 'chat.json', 'chat.msgpack']), (JSON, 'chat.json'))
+
+    def test_plain_json_without_a_known_subprotocol(self):
+        self.assertEqual(frames.negotiate([]), (JSON, None))
+        self.assertEqual(frames.negotiate(['graphql-ws']), (JSON, None))
+
+    def test_msgpack_is_not_offered_back_without_the_library(self):
+        with mock.patch.object(frames, 'msgpack', None):
+            self.assertEqual(frames.negotiate(['chat.msgpack', 'chat.json']), (JSON, 'chat.json'))
+            self.assertEqual(frames.negotiate(['chat.msgpack']), (JSON, None))
+
+
+class CodecTests(SimpleTestCase):
+    payload = {'type': 'chat_message', 'message': 'héllo', 'seq': 7, 'reply_to': None}
+
+    def test_json_frames_are_compact_text(self):
+        text_data, bytes_data = frames.encode(self.payload, JSON)
+        self.assertIsNone(bytes_data)
+        self.assertEqual(text_data, '{"type":"chat_message","message":"héllo","seq":7,"reply_to":null}')
+
+    def test_msgpack_frames_are_binary(self):
+        text_data, bytes_data = frames.encode(self.payload, MSGPACK)
+        self.assertIsNone(text_data)
+        self.assertEqual(msgpack.unpackb(bytes_data), self.payload)
+
+    def test_prepare_carries_both_encodings(self):
+        event = frames.prepare(self.payload, user_id='1')
+        self.assertEqual((event['type'], event['user_id']), ('chat_message', '1'))
+        self.assertEqual(event[JSON], frames.encode(self.payload, JSON)[0])
+        self.assertEqual(event[MSGPACK], frames.encode(self.payload, MSGPACK)[1])
+
+    def test_inbound_frames_decode_from_either_codec(self):
+        frame = {'type': 'sync', 'after': 3}
+        self.assertEqual(frames.decode(text_data=json.dumps(frame), accepts=ROOM_FRAMES), frame)
+        self.assertEqual(frames.decode(bytes_data=msgpack.packb(frame), accepts=ROOM_FRAMES), frame)
+
+    def test_type_defaults_for_legacy_frames(self):
+        frame = frames.decode(text_data='{"message": "hi"}', accepts=ROOM_FRAMES, default_type='chat_message')
+        self.assertEqual(frame, {'type': 'chat_message', 'message': 'hi'})
+
+
+class DecodeRejectionTests(SimpleTestCase):
+    def assertRejected(self, text_data=None, bytes_data=None, accepts=ROOM_FRAMES):
+        with self.assertRaises(FrameError):
+            frames.decode(text_data, bytes_data, accepts)
+
+    def test_empty_and_undecodable_frames(self):
+        self.assertRejected()
+        self.assertRejected(text_data='{"type": ')
+        self.assertRejected(bytes_data=b'\xc1')  # a byte msgpack never uses
+
+    @override_settings(CHAT_MAX_FRAME_BYTES=32)
+    def test_oversized_frames(self):
+        self.assertRejected(text_data=json.dumps({'type': 'chat_message', 'message': 'x' * 32}))
+
+    def test_frames_that_are_not_objects(self):
+        self.assertRejected(text_data='[1, 2]')
+        self.assertRejected(bytes_data=msgpack.packb('sync'))
+
+    def test_unknown_or_unaccepted_types(self):
+        self.assertRejected(text_data='{"type": "drop_tables"}')
+        self.assertRejected(text_data='{"type": "subscribe", "rooms": []}')  # known, but not a room frame
+        self.assertRejected(text_data='{"after": 1}')  # no type and no default
+
+
+class FrameSpecTests(SimpleTestCase):
+    spec = FrameSpec(after=((int,), True), limit=((int,), False), active=((bool,), False), note=((str, type(None)), False))
+
+    def clean(self, **fields):
+        return self.spec.clean({'type': 'sync', **fields})
+
+    def test_undeclared_fields_are_dropped(self):
+        self.assertEqual(self.clean(after=1, user_id='42', __asgi_channel__='x'), {'type': 'sync', 'after': 1})
+
+    def test_declared_types_are_enforced(self):
+        self.assertEqual(self.clean(after=1, note=None), {'type': 'sync', 'after': 1, 'note': None})
+        for fields in ({'after': '1'}, {'after': 1.5}, {'after': 1, 'limit': None}, {'after': 1, 'note': 3}):
+            with self.subTest(fields=fields), self.assertRaises(FrameError):
+                self.clean(**fields)
+
+    def test_bool_and_int_are_not_interchangeable(self):
+        self.assertEqual(self.clean(after=0, active=True)['active'], True)
+        with self.assertRaises(FrameError):
+            self.clean(after=True)
+        with self.assertRaises(FrameError):
+            self.clean(after=1, active=1)
+
+    def test_required_fields(self):
+        with self.assertRaisesMessage(FrameError, "missing 'after'"):
+            self.clean(limit=10)
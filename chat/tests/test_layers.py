@@ -0,0 +1,244 @@
+import asyncio
+import random
+import shutil
+import uuid
+from collections import Counter
+from unittest import mock, skipUnless
+
+import redis
+from django.test import SimpleTestCase
+
+try:
+    import fakeredis
+except ImportError:  # the Redis-backed copies of the hybrid tests still run
+    fakeredis = None
+
+from chat.layers import HashRing, HybridChannelLayer, ShardedRedisChannelLayer
+from chat.management.commands.redis_nodes import LocalRedisNodes
+
+NODES = [f"redis://127.0.0.1:{7001 + index}" for index in range(5)]
+
+
+def room_names(count, seed=42):
+    rng = random.Random(seed)
+    return [f"chat_{uuid.UUID(int=rng.getrandbits(128))}" for _ in range(count)]
+
+
+class HashRingTests(SimpleTestCase):
+    keys = room_names(20000)
+
+    def owners(self, nodes):
+        ring = HashRing(nodes)
+        return {key: nodes[ring.node_for(key)] for key in self.keys}
+
+    def test_placement_is_stable_and_balanced(self):
+        self.assertEqual(self.owners(NODES[:4]), self.owners(NODES[:4]))
+        counts = Counter(self.owners(NODES[:4]).values())
+        for node in NODES[:4]:
+            self.assertAlmostEqual(counts[node] / len(self.keys), 1 / 4, delta=0.04)
+
+    def test_placement_follows_node_names_not_their_order(self):
+        self.assertEqual(self.owners(NODES[:4]), self.owners(NODES[:4][::-1]))
+
+    def test_adding_a_node_only_moves_keys_onto_it(self):
+        before, after = self.owners(NODES[:4]), self.owners(NODES)
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertEqual({after[key] for key in moved}, {NODES[4]})
+        self.assertAlmostEqual(len(moved) / len(self.keys), 1 / 5, delta=0.05)
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        removed = NODES[2]
+        before = self.owners(NODES)
+        after = self.owners([node for node in NODES if node != removed])
+        moved = {key for key in self.keys if before[key] != after[key]}
+        self.assertEqual(moved, {key for key in self.keys if before[key] == removed})
+
+
+@skipUnless(shutil.which('redis-server'), "redis-server not installed")
+class ShardedRedisChannelLayerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nodes = LocalRedisNodes(3, base_port=7401)
+        cls.nodes.__enter__()
+        cls.addClassCleanup(cls.nodes.__exit__, None, None, None)
+
+    def setUp(self):
+        self.layer = ShardedRedisChannelLayer(hosts=self.nodes.urls)
+        self.clients = [redis.Redis.from_url(url) for url in self.nodes.urls]
+        for client in self.clients:
+            client.flushall()
+            self.addCleanup(client.close)
+
+    def holders(self, key):
+        """Indexes of the nodes storing `key`."""
+        return [index for index, client in enumerate(self.clients) if client.exists(key)]
+
+    async def receive(self, channel):
+        return await asyncio.wait_for(self.layer.receive(channel), 5)
+
+    async def test_groups_are_stored_and_sent_on_their_ring_node(self):
+        try:
+            await self.check_group_routing()
+        finally:
+            await self.layer.close_pools()
+
+    async def check_group_routing(self):
+        channel = await self.layer.new_channel()
+        groups = room_names(30)
+        for group in groups:
+            await self.layer.group_add(group, channel)
+        for group in groups:
+            self.assertEqual(self.holders(self.layer._group_key(group)), [self.layer.ring.node_for(group)])
+        self.assertEqual(len({self.layer.consistent_hash(group) for group in groups}), len(self.nodes.urls))
+
+        await self.layer.group_send(groups[0], {'type': 'chat.message', 'text': 'hi'})
+        self.assertEqual((await self.receive(channel))['text'], 'hi')
+
+    async def test_channels_live_on_their_process_node(self):
+        try:
+            await self.check_channel_routing()
+        finally:
+            await self.layer.close_pools()
+
+    async def check_channel_routing(self):
+        channels = [await self.layer.new_channel() for _ in range(20)]
+        inbound = self.layer.non_local_name(channels[0])
+        node = self.layer.ring.node_for(inbound)
+        self.assertEqual({self.layer.consistent_hash(channel) for channel in channels}, {node})
+
+        for index, channel in enumerate(channels):
+            await self.layer.send(channel, {'type': 'chat.message', 'index': index})
+        self.assertEqual(self.holders(self.layer.prefix + inbound), [node])
+        received = [(await self.receive(channel))['index'] for channel in channels]
+        self.assertEqual(received, list(range(20)))
+
+
+class FakeHybridChannelLayer(HybridChannelLayer):
+    """HybridChannelLayer over in-memory fakeredis servers, one per host."""
+
+    def __init__(self, servers, **kwargs):
+        self.servers = servers
+        super().__init__(hosts=[f"redis://fake-{index}" for index in range(len(servers))], **kwargs)
+
+    def create_pool(self, index):
+        return fakeredis.FakeAsyncRedis(server=self.servers[index]).connection_pool
+
+    async def receive(self, channel):
+        # Group messages only: no task blocking on direct sends, whose cancellation
+        # fakeredis can lose on Python 3.11, hanging close_pools()
+        return await self.receive_buffer[channel].get()
+
+
+class HybridChannelLayerChecks:
+    """Tests for any two-node HybridChannelLayer returned by new_layer()."""
+    group = 'chat_room'
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), 5)
+
+    async def registered(self, layer):
+        """Inboxes in the group's membership registry."""
+        connection = layer.connection(layer.consistent_hash(self.group))
+        return {inbox.decode() for inbox in await connection.smembers(layer._members_key(self.group))}
+
+    async def settled(self, layer, changes=1):
+        """Wait until `changes` membership notices for the group came back, so the registry can be cached."""
+        state = layer._loop_state()
+        async with asyncio.timeout(5):
+            while state.invalidations[self.group] < changes:
+                await asyncio.sleep(0.01)
+
+    async def test_local_members_are_served_from_memory(self):
+        layer = self.new_layer()
+        try:
+            channels = [await layer.new_channel() for _ in range(2)]
+            for channel in channels:
+                await layer.group_add(self.group, channel)
+            await self.settled(layer)
+            await layer.group_send(self.group, {'type': 'chat.message', 'n': 1})  # reads and caches the registry
+            with mock.patch.object(layer, 'connection', side_effect=AssertionError("group_send used Redis")):
+                await layer.group_send(self.group, {'type': 'chat.message', 'n': 2})
+            for channel in channels:
+                self.assertEqual([(await self.receive(layer, channel))['n'] for _ in range(2)], [1, 2])
+        finally:
+            await layer.close_pools()
+
+    async def test_other_processes_get_group_messages_through_their_inbox(self):
+        sender, other = self.new_layer(), self.new_layer()  # two processes
+        try:
+            mine, theirs = await sender.new_channel(), await other.new_channel()
+            await sender.group_add(self.group, mine)
+            await other.group_add(self.group, theirs)
+
+            await sender.group_send(self.group, {'type': 'chat.message', 'text': 'hi'})
+            self.assertEqual((await self.receive(sender, mine))['text'], 'hi')
+            self.assertEqual((await self.receive(other, theirs))['text'], 'hi')
+            self.assertEqual(await self.registered(sender), {sender._loop_state().inbox, other._loop_state().inbox})
+        finally:
+            await sender.close_pools()
+            await other.close_pools()
+
+    async def test_membership_changes_drop_cached_registries(self):
+        sender, other = self.new_layer(), self.new_layer()
+        try:
+            mine = await sender.new_channel()
+            await sender.group_add(self.group, mine)
+            await self.settled(sender)
+            await sender.group_send(self.group, {'type': 'chat.message', 'n': 1})
+            state = sender._loop_state()
+            self.assertEqual(state.inboxes[self.group], {state.inbox})
+
+            theirs = await other.new_channel()
+            await other.group_add(self.group, theirs)
+            await self.settled(sender, changes=2)
+            self.assertNotIn(self.group, state.inboxes)
+            await sender.group_send(self.group, {'type': 'chat.message', 'n': 2})
+            self.assertEqual([(await self.receive(sender, mine))['n'] for _ in range(2)], [1, 2])
+            self.assertEqual((await self.receive(other, theirs))['n'], 2)
+
+            await other.group_discard(self.group, theirs)
+            await self.settled(sender, changes=3)
+            await sender.group_send(self.group, {'type': 'chat.message', 'n': 3})
+            self.assertEqual(state.inboxes[self.group], {state.inbox})
+        finally:
+            await sender.close_pools()
+            await other.close_pools()
+
+    async def test_group_send_from_a_loop_without_members(self):
+        layer = self.new_layer()
+        try:
+            channel = await layer.new_channel()
+            await layer.group_add(self.group, channel)
+            # e.g. async_to_sync() in an HTTP view: another event loop, in another thread
+            await asyncio.to_thread(asyncio.run, layer.group_send(self.group, {'type': 'chat.message', 'text': 'hi'}))
+            self.assertEqual((await self.receive(layer, channel))['text'], 'hi')
+        finally:
+            await layer.close_pools()
+
+
+@skipUnless(fakeredis, "fakeredis not installed")
+class HybridChannelLayerTests(HybridChannelLayerChecks, SimpleTestCase):
+    def setUp(self):
+        self.servers = [fakeredis.FakeServer() for _ in range(2)]
+
+    def new_layer(self):
+        return FakeHybridChannelLayer(self.servers)
+
+
+@skipUnless(shutil.which('redis-server'), "redis-server not installed")
+class RedisHybridChannelLayerTests(HybridChannelLayerChecks, SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nodes = LocalRedisNodes(2, base_port=7411)
+        cls.nodes.__enter__()
+        cls.addClassCleanup(cls.nodes.__exit__, None, None, None)
+
+    def setUp(self):
+        for url in self.nodes.urls:
+            with redis.Redis.from_url(url) as client:
+                client.flushall()
+
+    def new_layer(self):
+        return HybridChannelLayer(hosts=self.nodes.urls)
@@ -0,0 +1,109 @@
+import asyncio
+import shutil
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from chat import frames, ratelimit, state
+from chat.consumers import FrameMixin
+from chat.management.commands.redis_nodes import LocalRedisNodes
+
+LIMITS = {'default': {'connection': (2, 3), 'user': (1, 5)}}
+
+
+@skipUnless(shutil.which('redis-server'), "redis-server not installed")
+@override_settings(CHAT_RATE_LIMITS=LIMITS)
+class TokenBucketTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nodes = LocalRedisNodes(1, base_port=7421)
+        cls.nodes.__enter__()
+        cls.addClassCleanup(cls.nodes.__exit__, None, None, None)
+
+    def setUp(self):
+        url = self.nodes.urls[0]
+        with redis.Redis.from_url(url) as client:
+            client.flushall()
+        redis_url = override_settings(CHAT_REDIS_URL=url)
+        redis_url.enable()
+        self.addCleanup(redis_url.disable)
+
+    async def take(self, count, channel='conn-a', user_id=1):
+        try:
+            return [await ratelimit.take(user_id, channel, 'typing') for _ in range(count)]
+        finally:
+            await state.get_redis().aclose()
+
+    async def test_burst_then_refused(self):
+        self.assertEqual(await self.take(4), [None, None, None, 'connection'])
+
+    async def test_tokens_refill_at_the_rate(self):
+        await self.take(4)
+        await asyncio.sleep(0.7)  # 1.4 tokens at 2/s
+        self.assertEqual(await self.take(2), [None, 'connection'])
+
+    async def test_refill_stops_at_the_burst(self):
+        await self.take(3)
+        await asyncio.sleep(2)  # 4 tokens' worth, capped at 3
+        self.assertEqual(await self.take(4), [None, None, None, 'connection'])
+
+    async def test_user_bucket_spans_connections(self):
+        self.assertEqual(await self.take(3, channel='conn-a'), [None] * 3)
+        self.assertEqual(await self.take(3, channel='conn-b'), [None, None, 'user'])
+
+    async def test_refusals_are_counted_and_not_charged(self):
+        await self.take(5)
+        counters = await state.get_redis().hgetall(state.COUNTERS_KEY)
+        self.assertEqual(counters, {'throttled:connection:typing': '2'})
+        # The refused frames did not draw from the user bucket: two tokens are left there
+        self.assertEqual(await self.take(3, channel='conn-b'), [None, None, 'user'])
+
+
+class Socket(FrameMixin):
+    """FrameMixin over a fake socket and a layer buffer holding `waiting` messages."""
+    channel_name = 'specific.abc!def'
+
+    def __init__(self, waiting):
+        queue = asyncio.Queue()
+        for _ in range(waiting):
+            queue.put_nowait({})
+        self.channel_layer = SimpleNamespace(receive_buffer={self.channel_name: queue})
+        self.sent, self.closed = [], None
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent.append(text_data)
+
+    async def close(self, code=None):
+        self.closed = code
+
+
+@override_settings(CHAT_SLOW_CONSUMER_BACKLOG=3)
+class SlowConsumerTests(SimpleTestCase):
+    event = frames.prepare({'type': 'chat_message', 'message': 'hi'})
+
+    async def forward(self, socket):
+        with mock.patch.object(state, 'incr_counter', mock.AsyncMock()) as incr_counter:
+            await socket.forward(self.event)
+            await socket.forward(self.event)
+        return incr_counter
+
+    async def test_sockets_keeping_up_get_every_broadcast(self):
+        socket = Socket(waiting=2)
+        incr_counter = await self.forward(socket)
+        self.assertEqual((socket.sent, socket.closed), ([self.event[frames.JSON]] * 2, None))
+        incr_counter.assert_not_called()
+
+    async def test_a_backlog_drops_the_socket_once(self):
+        socket = Socket(waiting=3)
+        incr_counter = await self.forward(socket)
+        self.assertEqual((socket.sent, socket.closed), ([], 4008))
+        incr_counter.assert_awaited_once_with('slow_consumers_dropped')
+
+    async def test_layers_without_a_buffer_never_drop(self):
+        socket = Socket(waiting=0)
+        socket.channel_layer = SimpleNamespace()
+        await self.forward(socket)
+        self.assertEqual(len(socket.sent), 2)
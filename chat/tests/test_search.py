@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from chat.models import Channel, Contact, Conversation, Message
+from chat.search import search_messages
+from chat.views import get_chat_list_context
+
+User = get_user_model()
+
+
+class ChatListSearchTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='Bobby', email='bob@example.com')
+        self.carol = User.objects.create_user(mobile='300', username='carol', email='carol@example.com')
+        self.with_bob = Conversation.objects.create(initiator=self.alice, receiver=self.bob)
+        self.with_carol = Conversation.objects.create(initiator=self.carol, receiver=self.alice)
+
+    def search(self, query):
+        request = RequestFactory().get('/', {'search': query})
+        request.user = self.alice
+        request.session = {}
+        return [row['id'] for row in get_chat_list_context(request)['chat_list'] if row['type'] == 'chat']
+
+    def test_matches_the_other_participant_by_prefix(self):
+        self.assertEqual(self.search('bob'), [self.with_bob.id])
+        self.assertEqual(self.search('CAR'), [self.with_carol.id])
+        self.assertEqual(self.search('30'), [self.with_carol.id])
+
+    def test_does_not_match_inside_names_or_on_the_viewer(self):
+        self.assertEqual(self.search('obby'), [])
+        self.assertEqual(self.search('alice'), [])
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='bob', email='bob@example.com')
+        self.joined = Channel.objects.create(name='joined', creator=self.bob)
+        self.joined.subscribers.add(self.alice)
+        self.public = Channel.objects.create(name='public', creator=self.bob)
+        self.chat = Conversation.objects.create(initiator=self.alice, receiver=self.bob)
+
+    def search(self, text):
+        return {msg.text for msg in search_messages(self.alice, text)[0]}
+
+    def test_covers_chats_and_joined_channels_only(self):
+        Message.objects.create(conversation=self.chat, sender=self.bob, text='launch in chat')
+        Message.objects.create(channel=self.joined, sender=self.bob, text='launch in joined')
+        Message.objects.create(channel=self.public, sender=self.bob, text='launch in public')
+        self.assertEqual(self.search('launch'), {'launch in chat', 'launch in joined'})
+
+    def test_own_channels_are_searchable(self):
+        mine = Channel.objects.create(name='mine', creator=self.alice)
+        Message.objects.create(channel=mine, sender=self.alice, text='launch notes')
+        self.assertEqual(self.search('laun'), {'launch notes'})
+
+
+class ContactsPageSearchTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='bob', email='bob@example.com')
+        self.carol = User.objects.create_user(mobile='300', username='carol', email='carol@example.com')
+        Contact.objects.create(owner=self.alice, saved_user=self.bob, name='Bob Smith')
+        Contact.objects.create(owner=self.alice, saved_user=self.carol, name='Carol Jones')
+        self.client.force_login(self.alice)
+
+    def test_search_parameter_filters_the_page(self):
+        response = self.client.get(reverse('contacts_page'), {'search': 'bo'})
+        self.assertEqual(response.context['search_query'], 'bo')
+        self.assertEqual([c.name for c in response.context['contacts']], ['Bob Smith'])
+
+    def test_without_a_search_every_contact_is_listed(self):
+        response = self.client.get(reverse('contacts_page'))
+        self.assertEqual({c.name for c in response.context['contacts']}, {'Bob Smith', 'Carol Jones'})
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from chat import frames
+from chat.consumers import RoomConsumer, SyncMixin
+from chat.models import Conversation, Group, Message, ReadCursor
+from chat.persistence import MessageWriteBuffer
+from chat.utils import room_group_name
+
+User = get_user_model()
+
+
+class SeqTestCase(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='bob', email='bob@example.com')
+        self.chat = Conversation.objects.create(initiator=self.alice, receiver=self.bob)
+
+    def message(self, text='hi', sender=None):
+        return Message(conversation=self.chat, sender=sender or self.alice, text=text, timestamp=timezone.now())
+
+
+class AllocateSeqsTests(SeqTestCase):
+    def test_numbers_each_room_in_list_order(self):
+        group = Group.objects.create(name='team', creator=self.alice)
+        messages = [self.message('a'), Message(group=group, sender=self.alice, text='b'), self.message('c')]
+        Message.allocate_seqs(messages)
+        self.assertEqual([msg.seq for msg in messages], [1, 1, 2])
+
+    def test_continues_from_the_stored_messages(self):
+        self.message('first').save()
+        batch = [self.message('second'), self.message('third')]
+        Message.allocate_seqs(batch)
+        self.assertEqual([msg.seq for msg in batch], [2, 3])
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.last_seq, 3)
+
+
+class WriteBufferTests(SeqTestCase):
+    def test_stored_messages_keep_the_time_they_were_sent(self):
+        msg = self.message()
+        msg.timestamp -= timedelta(seconds=30)  # queued in the buffer for a while
+        async_to_sync(MessageWriteBuffer(max_delay_ms=0).submit)(msg)
+        self.assertEqual(Message.objects.get(id=msg.id).timestamp, msg.timestamp)
+
+
+class SyncClient(SyncMixin):
+    """SyncMixin with the socket replaced by a list of sent frames."""
+
+    def __init__(self, user, room):
+        self.user, self.kind, self.room = user, 'conversation', room
+        self.sent = []
+
+    async def send_frame(self, data):
+        self.sent.append(data)
+
+
+@override_settings(CHAT_SYNC_PAGE_SIZE=2, CHAT_ACK_FLUSH_SECONDS=60)
+class SyncTests(SeqTestCase):
+    def setUp(self):
+        super().setUp()
+        for text in ['one', 'two', 'three']:
+            self.message(text).save()
+        self.consumer = SyncClient(self.bob, self.chat)
+
+    def sync(self, after, limit=None):
+        async_to_sync(self.consumer.sync)(after, limit)
+        reply = self.consumer.sent.pop()
+        return [event['message'] for event in reply['messages']], reply['has_more']
+
+    def test_pages_after_the_given_seq(self):
+        self.assertEqual(self.sync(0), (['one', 'two'], True))
+        self.assertEqual(self.sync(2), (['three'], False))
+        self.assertEqual(self.sync(-5, limit=1), (['one'], True))
+
+    def test_limits_are_clamped_to_the_page_size(self):
+        self.assertEqual(self.sync(0, limit=100), (['one', 'two'], True))
+        self.assertEqual(self.sync(0, limit=0), (['one', 'two'], True))
+        self.assertEqual(self.sync(0, limit=-1), (['one'], True))
+
+    def delivered(self):
+        return ReadCursor.objects.filter(user=self.bob, conversation=self.chat).values_list('delivered_seq', flat=True).first()
+
+    def test_acks_are_written_at_most_once_per_interval(self):
+        async_to_sync(self.consumer.ack)(1)
+        self.assertEqual(self.delivered(), 1)
+        async_to_sync(self.consumer.ack)(2)
+        self.assertEqual(self.delivered(), 1)
+        async_to_sync(self.consumer.flush_ack)()
+        self.assertEqual(self.delivered(), 2)
+
+    def test_acks_never_pass_the_last_stored_seq(self):
+        async_to_sync(self.consumer.ack)(99)
+        self.assertEqual(self.delivered(), 3)
+
+
+@override_settings(CHAT_WRITE_DURABLE=False)
+class MessageSeqsFrameTests(SeqTestCase):
+    def test_each_flush_tells_the_room_the_new_seqs(self):
+        layer = get_channel_layer()
+        messages = [self.message('one'), self.message('two', sender=self.bob)]
+
+        async def flush_and_listen():
+            channel = await layer.new_channel()
+            await layer.group_add(room_group_name('conversation', self.chat.id), channel)
+            buffer = MessageWriteBuffer(max_delay_ms=0)
+            await asyncio.gather(*(buffer.submit(msg) for msg in messages))
+            return await layer.receive(channel)
+
+        event = async_to_sync(flush_and_listen)()
+        self.assertEqual(event['type'], 'message_seqs')
+        self.assertEqual(json.loads(event[frames.JSON])['seqs'], [[str(messages[0].id), 1], [str(messages[1].id), 2]])
+
+
+class RoomSyncTests(SeqTestCase):
+    def test_messages_of_deleted_accounts_sync_without_a_sender_name(self):
+        group = Group.objects.create(name='team', creator=self.alice)
+        carol = User.objects.create_user(mobile='300', username='carol', email='carol@example.com')
+        Message.objects.create(group=group, sender=carol, text='bye')
+        Message.objects.create(group=group, sender=self.alice, text='hi')
+        carol.delete()
+
+        consumer = RoomConsumer()
+        consumer.user, consumer.kind, consumer.room = self.alice, 'group', group
+        events, _ = async_to_sync(consumer.messages_after)(0, 10)
+        self.assertEqual([(event['message'], event['sender_name']) for event in events], [('bye', None), ('hi', 'alice')])
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from chat.serving import parse_range, serve_file
+
+CONTENT = b'0123456789'
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_header_or_unhandled_forms_serve_the_whole_file(self):
+        for header in [None, '', 'bytes=-', 'bytes=0-1,4-5', 'items=0-1', 'bytes=a-b']:
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 10))
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-3', 10), (0, 3))
+        self.assertEqual(parse_range('bytes=4-', 10), (4, 9))
+        self.assertEqual(parse_range('bytes=8-100', 10), (8, 9))
+        self.assertEqual(parse_range('bytes = 2 - 5', 10), (2, 5))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=-30', 10), (0, 9))
+        self.assertIs(parse_range('bytes=-0', 10), False)
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range('bytes=10-', 10), False)
+        self.assertIs(parse_range('bytes=5-2', 10), False)
+
+    def test_nothing_in_an_empty_file_is_satisfiable(self):
+        for header in ['bytes=0-', 'bytes=0-0', 'bytes=-5']:
+            with self.subTest(header=header):
+                self.assertIs(parse_range(header, 0), False)
+
+
+@override_settings(CHAT_MEDIA_ACCEL='')
+class ServeFileRangeTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.name = default_storage.save('clip.bin', ContentFile(CONTENT))
+
+    def get(self, byte_range, if_range=None):
+        headers = {'Range': byte_range, **({'If-Range': if_range} if if_range else {})}
+        request = RequestFactory().get('/', headers=headers)
+        response = serve_file(request, self.name, etag='v1')
+        return response.status_code, b''.join(response)
+
+    def test_range_with_current_if_range(self):
+        self.assertEqual(self.get('bytes=2-4', '"v1"'), (206, b'234'))
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        self.assertEqual(self.get('bytes=2-4', '"old"'), (200, CONTENT))
+
+    def test_stale_if_range_wins_over_an_unsatisfiable_range(self):
+        self.assertEqual(self.get('bytes=50-', '"old"'), (200, CONTENT))
+        self.assertEqual(self.get('bytes=50-')[0], 416)
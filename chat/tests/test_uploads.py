@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from chat.models import Blob, Conversation, Message, UploadSession
+from chat.uploads import UploadError, commit_upload, partial_path, start_upload, write_chunk
+
+User = get_user_model()
+
+CONTENT = b'abcdefghij'  # 3 chunks of 4, 4 and 2 bytes
+
+
+@override_settings(CHAT_UPLOAD_CHUNK_SIZE=4, CHAT_MEDIA_PIPELINE='worker')
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.alice = User.objects.create_user(mobile='100', username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(mobile='200', username='bob', email='bob@example.com')
+        self.chat = Conversation.objects.create(initiator=self.alice, receiver=self.bob)
+
+    def start(self, content=CONTENT, filename='notes.txt'):
+        return start_upload(self.alice, self.chat, filename, len(content))
+
+    def put(self, session, index, data):
+        return write_chunk(session.id, self.alice, index, io.BytesIO(data))
+
+    def put_all(self, session, content=CONTENT):
+        for index in range(session.total_chunks):
+            self.put(session, index, content[index * 4:(index + 1) * 4])
+
+    def commit(self, session):
+        with self.captureOnCommitCallbacks(execute=True):
+            return commit_upload(session.id, self.alice)
+
+    def stored_bytes(self, msg):
+        with open(os.path.join(self.media_root, msg.blob.file.name), 'rb') as f:
+            return f.read()
+
+    def test_in_order_chunks_commit_into_a_message(self):
+        session = self.start()
+        self.assertEqual(session.total_chunks, 3)
+        self.put_all(session)
+
+        msg = self.commit(session)
+        self.assertEqual(self.stored_bytes(msg), CONTENT)
+        self.assertEqual((msg.conversation_id, msg.text, msg.blob.size), (self.chat.id, 'notes.txt', len(CONTENT)))
+        self.assertFalse(os.path.exists(partial_path(session)))
+        self.assertFalse(UploadSession.objects.filter(id=session.id).exists())
+
+    def test_out_of_order_chunk_is_refused(self):
+        session = self.start()
+        with self.assertRaises(UploadError) as ctx:
+            self.put(session, 1, CONTENT[4:8])
+        self.assertEqual(ctx.exception.status, 409)
+
+        with self.assertRaises(UploadError) as ctx:
+            self.put(session, 3, b'')  # past the last chunk
+        self.assertEqual(ctx.exception.status, 409)
+        session.refresh_from_db()
+        self.assertEqual(session.received_chunks, 0)
+
+    def test_oversized_and_short_chunks_are_refused_and_truncated(self):
+        session = self.start()
+        with self.assertRaises(UploadError) as ctx:
+            self.put(session, 0, CONTENT[:5])  # one byte more than a chunk
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertEqual(os.path.getsize(partial_path(session)), 0)
+
+        with self.assertRaises(UploadError):
+            self.put(session, 0, CONTENT[:3])
+        self.assertEqual(os.path.getsize(partial_path(session)), 0)
+
+        session = self.put(session, 0, CONTENT[:4])
+        self.assertEqual(session.received_chunks, 1)
+
+    def test_commit_of_an_incomplete_upload_is_refused(self):
+        session = self.start()
+        self.put(session, 0, CONTENT[:4])
+        with self.assertRaises(UploadError) as ctx:
+            self.commit(session)
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_resume_after_an_interrupted_chunk(self):
+        session = self.start()
+        self.put(session, 0, CONTENT[:4])
+        # The connection dropped halfway through chunk 1
+        with self.assertRaises(UploadError):
+            self.put(session, 1, CONTENT[4:6])
+        # The client missed the ack of chunk 0 and sends it again: a no-op
+        session = self.put(session, 0, CONTENT[:4])
+        self.assertEqual(session.received_chunks, 1)
+
+        # It asks where to resume and carries on from there
+        session = UploadSession.objects.get(id=session.id)
+        self.assertEqual(session.received_chunks, 1)
+        self.put(session, 1, CONTENT[4:8])
+        self.put(session, 2, CONTENT[8:])
+        self.assertEqual(self.stored_bytes(self.commit(session)), CONTENT)
+
+    def test_duplicate_content_shares_one_blob(self):
+        first, second = self.start(), self.start(filename='copy.txt')
+        self.put_all(first)
+        self.put_all(second)
+
+        a, b = self.commit(first), self.commit(second)
+        self.assertEqual(a.blob_id, b.blob_id)
+        self.assertEqual(Blob.objects.get(pk=a.blob_id).ref_count, 2)
+        self.assertEqual(self.stored_bytes(b), CONTENT)
+        self.assertFalse(os.path.exists(partial_path(second)))
+
+    def test_rolled_back_commit_can_be_retried(self):
+        session = self.start()
+        self.put_all(session)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    commit_upload(session.id, self.alice)
+                    raise RuntimeError("failure after the message was created")
+        self.assertTrue(os.path.exists(partial_path(session)))
+        self.assertFalse(Message.objects.filter(conversation=self.chat).exists())
+
+        msg = self.commit(session)
+        self.assertEqual(self.stored_bytes(msg), CONTENT)
+
+
+    def test_malformed_init_requests_answer_400(self):
+        self.client.force_login(self.alice)
+        for payload in [
+            {'room_id': 'not-a-uuid', 'filename': 'notes.txt', 'size': 10},
+            {'filename': 'notes.txt', 'size': 10},
+            [str(self.chat.id)],
+            'notes.txt',
+        ]:
+            with self.subTest(payload=payload):
+                response = self.client.post(reverse('upload_init'), json.dumps(payload), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
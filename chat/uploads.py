@@ -0,0 +1,149 @@
+"""
+Resumable chunked attachment uploads.
+
+Protocol (views in chat/views.py):
+    1. POST  api/upload/init/                   -> {upload_id, chunk_size, next_chunk}
+    2. PUT   api/upload/<id>/chunk/<n>/ (raw body) -> {next_chunk}
+    3. POST  api/upload/<id>/commit/            -> the same payload as api/upload/
+A client that lost its connection asks GET api/upload/<id>/ for `next_chunk`
+and carries on from there.
+
+Chunks are streamed from the request body straight into a temp file under
+MEDIA_ROOT, so no more than one read buffer is held in memory. Nothing is
+visible in the chat until commit, which creates the Message and, once that
+transaction commits, renames the temp file into the blob store
+(chat/blobs.py; same filesystem, no copy). A commit that fails leaves the
+temp file and session as they were, so it can simply be retried.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import acquire_path
+from .models import Message, UploadSession
+
+PARTIAL_DIR = 'uploads/partial'
+_READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or commit that does not fit the session; `status` is the HTTP status to reply with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f"{session.id}.part")
+
+
+def start_upload(user, conversation, filename, size, content_type=''):
+    max_size = getattr(settings, 'CHAT_UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+    if size <= 0 or size > max_size:
+        raise UploadError("File is empty or too large.", status=413 if size > 0 else 400)
+
+    session = UploadSession.objects.create(
+        uploader=user,
+        conversation=conversation,
+        filename=os.path.basename(filename)[:255] or 'file',
+        content_type=content_type[:100],
+        size=size,
+        chunk_size=getattr(settings, 'CHAT_UPLOAD_CHUNK_SIZE', 1024 * 1024),
+    )
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def expected_chunk_length(session, index):
+    if index == session.total_chunks - 1:
+        return session.size - index * session.chunk_size
+    return session.chunk_size
+
+
+def write_chunk(session_id, user, index, stream):
+    """
+    Append chunk `index` from a file-like `stream` and return the updated session.
+    Chunks must arrive in order; re-sending an already stored chunk is a no-op,
+    so a client that missed the acknowledgement can safely retry.
+    """
+    with transaction.atomic():
+        # Row lock: concurrent PUTs for one session are applied one at a time
+        session = UploadSession.objects.select_for_update().filter(id=session_id, uploader=user).first()
+        if session is None:
+            raise UploadError("Upload not found.", status=404)
+        if index < session.received_chunks:
+            return session
+        if index != session.received_chunks or index >= session.total_chunks:
+            raise UploadError(f"Expected chunk {session.received_chunks}.", status=409)
+
+        expected = expected_chunk_length(session, index)
+        path = partial_path(session)
+        with open(path, 'r+b') as out:
+            # Drop whatever a previously interrupted PUT left past the last acknowledged chunk
+            out.seek(index * session.chunk_size)
+            out.truncate()
+            written = 0
+            while written <= expected:
+                data = stream.read(min(_READ_SIZE, expected + 1 - written))
+                if not data:
+                    break
+                out.write(data)
+                written += len(data)
+
+        if written != expected:
+            with open(path, 'r+b') as out:
+                out.truncate(index * session.chunk_size)
+            raise UploadError(f"Chunk {index} must be {expected} bytes, got {written}.")
+
+        session.received_chunks = index + 1
+        session.save(update_fields=['received_chunks', 'updated_at'])
+    return session
+
+
+def commit_upload(session_id, user):
+    """Turn a complete upload into a Message. Returns the message."""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related('conversation').filter(
+            id=session_id, uploader=user
+        ).first()
+        if session is None:
+            raise UploadError("Upload not found.", status=404)
+        if not session.is_complete:
+            raise UploadError(f"Upload incomplete, expected chunk {session.received_chunks}.", status=409)
+
+        # On commit: moves the temp file into the blob store, or drops it if the content is already stored
+        is_image = session.content_type.startswith('image')
+        blob = acquire_path(partial_path(session), session.filename, is_image=is_image)
+        msg = Message.objects.create(
+            conversation=session.conversation,
+            sender=user,
+            attachment=blob.file.name,
+            blob=blob,
+            is_media=is_image,
+            text=session.filename,  # Show filename as text fallback
+        )
+        session.conversation.record_message(msg)
+        session.delete()
+    return msg
+
+
+def purge_stale_sessions(max_age=None):
+    """Delete unfinished sessions (and their temp files) not touched within `max_age`."""
+    if max_age is None:
+        max_age = timedelta(hours=getattr(settings, 'CHAT_UPLOAD_SESSION_TTL_HOURS', 24))
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for session in stale.iterator():
+        try:
+            os.remove(partial_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
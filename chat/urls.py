@@ -7,6 +7,7 @@ urlpatterns = [
     
     # --- HTMX PARTIALS (2nd Column Lists) ---
     path('partial/list/chats/', views.chat_list_partial, name='list_chats'),
+    path('partial/list/chats/changes/', views.chat_list_changes, name='list_chats_changes'),
     path('partial/list/channels/', views.channels_list_partial, name='list_channels'),
     path('partial/list/calls/', views.calls_list_partial, name='list_calls'),
     path('partial/list/status/', views.status_list_partial, name='list_status'),
@@ -15,8 +16,12 @@ urlpatterns = [
     path('get-chat/<uuid:room_id>/', views.get_chat_content, name='get_chat_content'),
     path('get-group/<uuid:group_id>/', views.get_group_content, name='get_group_content'),
     path('get-channel/<uuid:channel_id>/', views.get_channel_content, name='get_channel_content'),
+    path('get-chat/<uuid:room_id>/older/', views.get_chat_history, name='get_chat_history'),
+    path('get-group/<uuid:group_id>/older/', views.get_group_history, name='get_group_history'),
+    path('get-channel/<uuid:channel_id>/older/', views.get_channel_history, name='get_channel_history'),
     path('profile/<int:user_id>/', views.get_user_profile, name='get_user_profile'),
     path('settings/', views.settings_page, name='settings_page'),
+    path('search/messages/', views.message_search, name='message_search'),
     
     # --- PAGES ---
     path('groups/', views.groups_page, name='groups_page'),
@@ -24,6 +29,7 @@ urlpatterns = [
     path('status/', views.status_page, name='status_page'),
     path('calls/', views.calls_page, name='calls_page'),
     path('contacts/', views.contacts_page, name='contacts_page'),
+    path('contacts/lookup/', views.contact_lookup, name='contact_lookup'),
 
     # --- GROUP ACTIONS ---
     path('group/create/', views.create_group, name='create_group'),
@@ -50,4 +56,8 @@ urlpatterns = [
 
     # FILE UPLOAD
     path('api/upload/', views.upload_attachment, name='upload_attachment'),
+    path('api/upload/init/', views.upload_init, name='upload_init'),
+    path('api/upload/<uuid:upload_id>/', views.upload_status, name='upload_status'),
+    path('api/upload/<uuid:upload_id>/chunk/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('api/upload/<uuid:upload_id>/commit/', views.upload_commit, name='upload_commit'),
 ]
\ No newline at end of file
@@ -0,0 +1,175 @@
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import DateTimeField, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Channel, Contact, Conversation, Group, Message, ReadCursor
+
+MESSAGE_PAGE_SIZE = 50
+UNREAD_COUNT_CAP = 100  # unread counts stop here; shown as "99+"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def default_user_label(user):
+    """Mobile number if set, else username (shown when no contact name exists)."""
+    return user.mobile if hasattr(user, 'mobile') and user.mobile else user.username
+
+
+class ContactNameResolver:
+    """
+    Resolves display names for one owner from their whole contact map.
+    The map is loaded lazily with a single query and reused until invalidated.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self._names = None
+
+    @property
+    def names(self):
+        """Dict of saved_user_id -> saved contact name."""
+        if self._names is None:
+            self._names = dict(
+                Contact.objects.filter(owner=self.owner).values_list('saved_user_id', 'name')
+            )
+        return self._names
+
+    def invalidate(self):
+        """Drop the cached map (call after the owner's contacts change)."""
+        self._names = None
+
+    def is_contact(self, user):
+        return user.id in self.names
+
+    def display_name(self, user):
+        return self.names.get(user.id) or default_user_label(user)
+
+
+def get_contact_resolver(request):
+    """Per-request resolver for request.user, created on first use."""
+    resolver = getattr(request, '_contact_resolver', None)
+    if resolver is None:
+        resolver = ContactNameResolver(request.user)
+        request._contact_resolver = resolver
+    return resolver
+
+
+# --- ACCESS ---
+
+def readable_messages(user):
+    """
+    Messages in chats, groups and channels the user is allowed to open (the
+    rooms of readable_rooms). The access rule for media serving and forwarding.
+    """
+    return Message.objects.filter(
+        Q(conversation__in=readable_rooms(user, 'conversation').values('id'))
+        | Q(group__in=readable_rooms(user, 'group').values('id'))
+        | Q(channel__in=readable_rooms(user, 'channel').values('id'))
+    )
+
+def searchable_messages(user):
+    """
+    Messages search may return: readable_messages, but only from channels the
+    user created or subscribed to. Public channels can be opened by anyone,
+    yet searching every one of them is not what "my messages" means.
+    """
+    return Message.objects.filter(
+        Q(conversation__in=readable_rooms(user, 'conversation').values('id'))
+        | Q(group__in=readable_rooms(user, 'group').values('id'))
+        | Q(channel__in=Channel.objects.filter(Q(creator=user) | Q(subscribers=user)).values('id'))
+    )
+
+def readable_rooms(user, kind):
+    """Conversations / groups / channels (`kind`) the user may open and follow live."""
+    if kind == 'conversation':
+        return Conversation.objects.filter(Q(initiator=user) | Q(receiver=user))
+    if kind == 'group':
+        return Group.objects.filter(Q(creator=user) | Q(members=user))
+    if kind == 'channel':
+        return Channel.objects.filter(Q(is_public=True) | Q(creator=user) | Q(subscribers=user))
+    raise ValueError(f"Unknown room kind {kind!r}")
+
+def writable_rooms(user, kind):
+    """Conversations / groups / channels (`kind`) the user may post into."""
+    if kind == 'channel':
+        return Channel.objects.filter(creator=user)  # channels are broadcast-only
+    return readable_rooms(user, kind)
+
+# Channel-layer group per room; ChatConsumer joins the conversation ones
+ROOM_GROUP_PREFIXES = {'conversation': 'chat', 'group': 'group', 'channel': 'channel'}
+
+def room_group_name(kind, room_id):
+    return f"{ROOM_GROUP_PREFIXES[kind]}_{room_id}"
+
+
+def user_group_name(user_id):
+    """Channel-layer group of all of a user's UserConsumer sockets (chat list updates)."""
+    return f"user_{user_id}"
+
+
+# --- MESSAGE HISTORY PAGINATION ---
+
+def encode_message_cursor(message):
+    """URL-safe keyset cursor for a message: '<epoch microseconds>_<uuid>'."""
+    micros = (message.timestamp - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{message.id}"
+
+def decode_message_cursor(cursor):
+    """Returns (timestamp, id) from a cursor, or None if it is malformed."""
+    try:
+        micros, message_id = cursor.split('_', 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), uuid.UUID(message_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_message_page(queryset, before=None, page_size=MESSAGE_PAGE_SIZE):
+    """
+    Keyset page over (timestamp, id): the newest `page_size` messages older than
+    the `before` cursor (or the newest overall). Returns (messages oldest-first,
+    cursor for the next older page or None).
+    """
+    position = decode_message_cursor(before) if before else None
+    if position:
+        timestamp, message_id = position
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+    page = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    page.reverse()
+
+    next_cursor = encode_message_cursor(page[0]) if has_more else None
+    return page, next_cursor
+
+
+# --- UNREAD COUNTS ---
+
+class _CountSubquery(Subquery):
+    """COUNT(*) of a (sliced) subquery's rows."""
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) AS _counted)'
+    output_field = IntegerField()
+
+
+def with_unread_counts(queryset, user, fk):
+    """
+    Annotates `unread_count` on a Conversation/Group/Channel queryset (`fk` is
+    the matching Message field name) within the same SELECT. Each row counts
+    messages from others newer than the user's ReadCursor watermark, which is a
+    range scan on the (fk, timestamp, id) index that stops after
+    UNREAD_COUNT_CAP rows: a room the user never opened (watermark at the
+    epoch) costs the same as one with a handful of unread messages, whatever
+    its history size. Badges show a capped count as "99+".
+    """
+    last_read = ReadCursor.objects.filter(user=user, **{fk: OuterRef('pk')}).values('last_read_at')[:1]
+    unread = (
+        Message.objects.filter(**{fk: OuterRef('pk')}, timestamp__gt=OuterRef('last_read_watermark'))
+        .exclude(sender=user)
+        .order_by()
+        .values('pk')[:UNREAD_COUNT_CAP]
+    )
+    return queryset.annotate(
+        last_read_watermark=Coalesce(Subquery(last_read), Value(_EPOCH, output_field=DateTimeField())),
+        unread_count=_CountSubquery(unread),
+    )
@@ -1,30 +1,49 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.contrib import messages
-from .models import Conversation, Message, Contact, Group, Channel
+from .models import Blob, Conversation, Message, Contact, Group, Channel, ReadCursor, UploadSession
+from . import blobs
+from .chat_list import changed_rows, parse_row_versions, push_conversation_updates, render_rows, row_version
+from .forwarding import ForwardError, forward_messages
+from .serving import serve_file
+from .search import lookup_contacts, lookup_users, search_messages
+from .uploads import UploadError, commit_upload, start_upload, write_chunk
+from .utils import get_contact_resolver, get_message_page, readable_messages, with_unread_counts
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
+import re
+import uuid
 
 User = get_user_model()
 
+# Chat list order: newest message first, falling back to when the chat was opened
+RECENT_CHATS_ORDERING = (Coalesce('last_message_at', 'start_time').desc(),)
+
 # --- HELPER FUNCTIONS ---
 
-def get_display_name(owner, target_user):
+def get_display_name(request, target_user):
     """Returns saved contact name if exists, else mobile/username."""
-    try:
-        contact = Contact.objects.get(owner=owner, saved_user=target_user)
-        return contact.name
-    except Contact.DoesNotExist:
-        return target_user.mobile if hasattr(target_user, 'mobile') and target_user.mobile else target_user.username
+    return get_contact_resolver(request).display_name(target_user)
+
+def can_view_group(user, group):
+    return user == group.creator or group.members.filter(id=user.id).exists()
+
+def can_view_channel(user, channel):
+    return (channel.is_public or user == channel.creator
+            or channel.subscribers.filter(id=user.id).exists())
 
 def get_chat_list_context(request):
     """
     Advanced Search Logic:
-    1. Finds existing chats matching query (Username/Mobile).
+    1. Finds existing chats whose other user's Username/Mobile starts with the query.
     2. Finds saved contacts matching query (Name/Mobile).
     3. Merges them so you can start chats with contacts directly from search.
     """
@@ -34,21 +53,17 @@ def get_chat_list_context(request):
     chat_data = []
     
     if query:
-        # A. Find Contacts matching Name or Mobile
-        contacts = Contact.objects.filter(
-            Q(owner=user) & 
-            (Q(name__icontains=query) | Q(saved_user__mobile__icontains=query))
-        ).select_related('saved_user')
+        # A. Find Contacts whose Name or Mobile starts with the query (bounded)
+        contacts = lookup_contacts(user, query)
         
-        # B. Find Chats matching Username or Mobile
-        conversations = Conversation.objects.filter(
-            Q(initiator=user) | Q(receiver=user)
-        ).filter(
-            Q(initiator__username__icontains=query) | 
-            Q(receiver__username__icontains=query) |
-            Q(initiator__mobile__icontains=query) | 
-            Q(receiver__mobile__icontains=query)
-        ).select_related('initiator', 'receiver').prefetch_related('messages')
+        # B. Find Chats whose other participant's Username or Mobile starts with the query
+        # (same prefix lookups as lookup_users, so they use the same indexes)
+        def other_matches(side):
+            return Q(**{f'{side}__username__istartswith': query}) | Q(**{f'{side}__mobile__startswith': query})
+
+        conversations = with_unread_counts(Conversation.objects.all(), user, 'conversation').filter(
+            (Q(initiator=user) & other_matches('receiver')) | (Q(receiver=user) & other_matches('initiator'))
+        ).select_related('initiator', 'receiver').order_by(*RECENT_CHATS_ORDERING)
 
         # Track IDs to avoid duplicates
         processed_ids = set()
@@ -58,15 +73,16 @@ def get_chat_list_context(request):
             other_user = chat.receiver if chat.initiator == user else chat.initiator
             processed_ids.add(other_user.id)
             
-            last_msg = chat.messages.last()
-            display_name = get_display_name(user, other_user)
+            display_name = get_display_name(request, other_user)
             
             chat_data.append({
                 'type': 'chat',
                 'id': chat.id,
                 'display_name': display_name,
-                'preview': last_msg.text if last_msg else "Active Chat",
-                'timestamp': last_msg.timestamp if last_msg else chat.start_time,
+                'preview': chat.last_message_text if chat.last_message_at else "Active Chat",
+                'timestamp': chat.last_message_at or chat.start_time,
+                'unread_count': chat.unread_count,
+                'version': row_version(chat),
             })
 
         # 2. Add Matching Contacts (Who don't have a chat yet)
@@ -85,27 +101,48 @@ def get_chat_list_context(request):
                 processed_ids.add(target_user.id)
 
     else:
-        # Default: Show all existing conversations
-        conversations = Conversation.objects.filter(
-            Q(initiator=user) | Q(receiver=user)
-        ).select_related('initiator', 'receiver').prefetch_related('messages')
+        chat_data = get_recent_chat_rows(request)
 
-        for chat in conversations:
-            other_user = chat.receiver if chat.initiator == user else chat.initiator
-            last_msg = chat.messages.last()
-            display_name = get_display_name(user, other_user)
-            
-            chat_data.append({
-                'type': 'chat',
-                'id': chat.id,
-                'display_name': display_name,
-                'preview': last_msg.text if last_msg else "New connection",
-                'timestamp': last_msg.timestamp if last_msg else chat.start_time,
-            })
-        
-        chat_data.sort(key=lambda x: x['timestamp'], reverse=True)
+    return {'chat_list': chat_data, 'chat_rows': render_rows(chat_data), 'search_query': query}
+
+def get_recent_chat_rows(request):
+    """Default chat list: all of the user's conversations, most recent activity first."""
+    user = request.user
+    conversations = with_unread_counts(Conversation.objects.all(), user, 'conversation').filter(
+        Q(initiator=user) | Q(receiver=user)
+    ).select_related('initiator', 'receiver').order_by(*RECENT_CHATS_ORDERING)
 
-    return {'chat_list': chat_data}
+    chat_data = []
+    for chat in conversations:
+        other_user = chat.receiver if chat.initiator == user else chat.initiator
+        display_name = get_display_name(request, other_user)
+        
+        chat_data.append({
+            'type': 'chat',
+            'id': chat.id,
+            'display_name': display_name,
+            'preview': chat.last_message_text if chat.last_message_at else "New connection",
+            'timestamp': chat.last_message_at or chat.start_time,
+            'unread_count': chat.unread_count,
+            'version': row_version(chat),
+        })
+    return chat_data
+
+def get_contact_lookup_context(request, query):
+    """All saved contacts without a query, else the matching contacts and other people"""
+    query = query.strip()
+    if not query:
+        contacts = Contact.objects.filter(owner=request.user).select_related('saved_user')
+        return {'contacts': contacts, 'search_query': ''}
+
+    contacts = lookup_contacts(request.user, query)
+    saved = get_contact_resolver(request).names
+    people = [person for person in lookup_users(request.user, query) if person.id not in saved]
+    return {
+        'contacts': sorted(contacts, key=lambda c: c.name.lower()),
+        'people': sorted(people, key=lambda p: p.username.lower()),
+        'search_query': query,
+    }
 
 # --- MAIN DASHBOARD ---
 
@@ -121,6 +158,12 @@ def chat_list_partial(request):
     context = get_chat_list_context(request)
     return render(request, 'chat/partials/list_chats.html', context)
 
+@login_required
+def chat_list_changes(request):
+    """Only the chat list rows that differ from the client's (?rows=id:version,...), as HTMX OOB swaps"""
+    known = parse_row_versions(request.GET.get('rows', ''))
+    return HttpResponse(changed_rows(get_recent_chat_rows(request), known))
+
 @login_required
 def channels_list_partial(request):
     return render(request, 'chat/partials/list_channels.html')
@@ -142,9 +185,9 @@ def get_chat_content(request, room_id):
         return HttpResponseForbidden()
 
     other_user = chat.receiver if chat.initiator == request.user else chat.initiator
-    messages = chat.messages.select_related('reply_to').all()
-    is_contact = Contact.objects.filter(owner=request.user, saved_user=other_user).exists()
-    display_name = get_display_name(request.user, other_user)
+    messages, next_cursor = get_message_page(chat.messages.select_related('sender', 'reply_to', 'blob'))
+    is_contact = get_contact_resolver(request).is_contact(other_user)
+    display_name = get_display_name(request, other_user)
 
     context = {
         'chat': chat,
@@ -152,14 +195,36 @@ def get_chat_content(request, room_id):
         'display_name': display_name,
         'is_contact': is_contact,
         'messages': messages,
+        'next_cursor': next_cursor,
+        'history_url': reverse('get_chat_history', args=[chat.id]),
+        'peer_read_at': ReadCursor.last_read_at_for(other_user, conversation=chat),
     }
     return render(request, 'chat/partials/chat_content.html', context)
 
+@login_required
+def get_chat_history(request, room_id):
+    """Older page of a conversation (HTMX infinite scroll, ?before=<cursor>)"""
+    chat = get_object_or_404(Conversation, id=room_id)
+    if request.user != chat.initiator and request.user != chat.receiver:
+        return HttpResponseForbidden()
+
+    messages, next_cursor = get_message_page(
+        chat.messages.select_related('sender', 'reply_to', 'blob'), before=request.GET.get('before')
+    )
+    other_user = chat.receiver if chat.initiator == request.user else chat.initiator
+    context = {
+        'messages': messages,
+        'next_cursor': next_cursor,
+        'history_url': reverse('get_chat_history', args=[chat.id]),
+        'peer_read_at': ReadCursor.last_read_at_for(other_user, conversation=chat),
+    }
+    return render(request, 'chat/partials/chat_messages.html', context)
+
 @login_required
 def get_user_profile(request, user_id):
     target_user = get_object_or_404(User, id=user_id)
-    is_contact = Contact.objects.filter(owner=request.user, saved_user=target_user).exists()
-    display_name = get_display_name(request.user, target_user)
+    is_contact = get_contact_resolver(request).is_contact(target_user)
+    display_name = get_display_name(request, target_user)
     
     context = {
         'target_user': target_user,
@@ -168,22 +233,52 @@ def get_user_profile(request, user_id):
     }
     return render(request, 'chat/partials/profile_full.html', context)
 
+@login_required
+def message_search(request):
+    """Ranked full-text search over the user's messages (HTMX partial, ?q=&page=)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+
+    found, has_next = search_messages(request.user, query, page=page)
+    results = []
+    for msg in found:
+        if msg.conversation_id:
+            chat = msg.conversation
+            other_user = chat.receiver if chat.initiator == request.user else chat.initiator
+            title = get_display_name(request, other_user) if other_user else "Chat"
+            url = reverse('get_chat_content', args=[chat.id])
+        elif msg.group_id:
+            title, url = msg.group.name, reverse('get_group_content', args=[msg.group_id])
+        else:
+            title, url = msg.channel.name, reverse('get_channel_content', args=[msg.channel_id])
+        results.append({'title': title, 'url': url, 'text': msg.text, 'timestamp': msg.timestamp})
+
+    context = {
+        'results': results,
+        'query': query,
+        'page': page,
+        'next_page': page + 1 if has_next else None,
+    }
+    return render(request, 'chat/partials/message_search_results.html', context)
+
 @login_required
 def settings_page(request):
     return render(request, 'chat/partials/settings.html', {'user': request.user})
 
 @login_required
 def contacts_page(request):
-    user = request.user
-    query = request.GET.get('search', '')
-    if query:
-        contacts = Contact.objects.filter(
-            Q(owner=user) & 
-            (Q(name__icontains=query) | Q(saved_user__mobile__icontains=query))
-        ).select_related('saved_user')
-    else:
-        contacts = Contact.objects.filter(owner=user).select_related('saved_user')
-    return render(request, 'chat/contacts.html', {'contacts': contacts, 'search_query': query})
+    """Contacts page; ?search= opens it with that lookup already applied"""
+    context = get_contact_lookup_context(request, request.GET.get('search', ''))
+    return render(request, 'chat/contacts.html', context)
+
+@login_required
+def contact_lookup(request):
+    """Search-as-you-type for the contacts page (HTMX partial, ?q=): at most LOOKUP_LIMIT of each kind"""
+    context = get_contact_lookup_context(request, request.GET.get('q', ''))
+    return render(request, 'chat/partials/contact_lookup_results.html', context)
 
 # --- ACTIONS ---
 
@@ -212,6 +307,30 @@ def start_chat_from_group_member(request, target_user_id):
         chat = Conversation.objects.create(initiator=request.user, receiver=target_user)
     return get_chat_content(request, chat.id)
 
+# --- MEDIA ---
+
+BLOB_FILE_RE = re.compile(r'^(?:blobs|thumbs)/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.\w+)?$')
+
+@login_required
+def serve_media(request, name):
+    """Attachment/thumbnail under MEDIA_URL, only for users who can read a message carrying it"""
+    match = BLOB_FILE_RE.match(name)
+    if match:
+        blob = Blob.objects.filter(pk=match['digest']).only('file', 'thumbnail').first()
+        if blob is None or name not in (blob.file.name, blob.thumbnail.name):
+            raise Http404("File not found")
+        msg = readable_messages(request.user).filter(blob=blob).only('text').first()
+        etag = f"{'t' if name == blob.thumbnail.name else ''}{blob.pk}"
+        immutable = True  # content-addressed: the name changes if the bytes do
+    else:
+        msg = readable_messages(request.user).filter(blob=None, attachment=name).only('text').first()
+        etag, immutable = None, False
+    if msg is None:
+        raise Http404("File not found")
+
+    filename = msg.text if match is None or name == blob.file.name else None
+    return serve_file(request, name, etag=etag, filename=filename, immutable=immutable)
+
 # --- FILE UPLOAD HANDLER ---
 @login_required
 @csrf_exempt # In production, handle CSRF properly via JS headers
@@ -228,24 +347,99 @@ def upload_attachment(request):
         # Check if image
         is_image = file.content_type.startswith('image')
         
-        msg = Message.objects.create(
-            conversation=chat,
-            sender=sender,
-            attachment=file,
-            is_media=is_image,
-            text=file.name # Show filename as text fallback
-        )
+        with transaction.atomic():
+            # Identical content is stored once and shared (chat/blobs.py)
+            blob = blobs.acquire_upload(file, is_image=is_image)
+            msg = Message.objects.create(
+                conversation=chat,
+                sender=sender,
+                attachment=blob.file.name,
+                blob=blob,
+                is_media=is_image,
+                text=file.name # Show filename as text fallback
+            )
+            chat.record_message(msg)
+        push_conversation_updates([msg])
         
         # 2. Return URL to JS so it can send it via WebSocket
-        return JsonResponse({
-            'status': 'ok',
-            'file_url': msg.attachment.url,
-            'is_media': is_image,
-            'message_id': str(msg.id),
-            'filename': file.name
-        })
+        return upload_response(msg)
     return JsonResponse({'status': 'error'}, status=400)
 
+def upload_response(msg):
+    return JsonResponse({
+        'status': 'ok',
+        'file_url': msg.attachment.url,
+        'is_media': msg.is_media,
+        'message_id': str(msg.id),
+        'filename': msg.text,
+    })
+
+def upload_progress(session):
+    return JsonResponse({
+        'status': 'ok',
+        'upload_id': str(session.id),
+        'chunk_size': session.chunk_size,
+        'total_chunks': session.total_chunks,
+        'next_chunk': session.received_chunks,
+    })
+
+@login_required
+@csrf_exempt
+def upload_init(request):
+    """Start a resumable upload: JSON {room_id, filename, size, content_type}"""
+    if request.method != "POST":
+        return JsonResponse({'status': 'error'}, status=405)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        size = int(data.get('size', 0))
+        room_id = uuid.UUID(str(data.get('room_id')))
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'error': 'Invalid request'}, status=400)
+
+    chat = Conversation.objects.filter(
+        Q(initiator=request.user) | Q(receiver=request.user), id=room_id
+    ).first()
+    if not chat:
+        return JsonResponse({'status': 'error', 'error': 'Chat not found'}, status=404)
+
+    try:
+        session = start_upload(request.user, chat, data.get('filename') or 'file', size, data.get('content_type') or '')
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'error': str(e)}, status=e.status)
+    return upload_progress(session)
+
+@login_required
+def upload_status(request, upload_id):
+    """Where to resume: the next chunk the server expects"""
+    session = get_object_or_404(UploadSession, id=upload_id, uploader=request.user)
+    return upload_progress(session)
+
+@login_required
+@csrf_exempt
+def upload_chunk(request, upload_id, index):
+    """Raw request body is chunk `index`; streamed to disk, never read whole"""
+    if request.method != "PUT":
+        return JsonResponse({'status': 'error'}, status=405)
+    try:
+        session = write_chunk(upload_id, request.user, index, request)
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'error': str(e)}, status=e.status)
+    return upload_progress(session)
+
+@login_required
+@csrf_exempt
+def upload_commit(request, upload_id):
+    if request.method != "POST":
+        return JsonResponse({'status': 'error'}, status=405)
+    try:
+        msg = commit_upload(upload_id, request.user)
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'error': str(e)}, status=e.status)
+    push_conversation_updates([msg])
+    return upload_response(msg)
+
 
 @login_required
 def add_contact(request):
@@ -265,6 +459,7 @@ def add_contact(request):
             return redirect('chat_dashboard')
         if not Contact.objects.filter(owner=request.user, saved_user=target_user).exists():
             Contact.objects.create(owner=request.user, saved_user=target_user, name=name)
+            get_contact_resolver(request).invalidate()
             messages.success(request, "Contact saved.")
         return redirect('chat_dashboard')
     return redirect('chat_dashboard')
@@ -299,6 +494,7 @@ def save_contact_api(request):
             if not created:
                 contact.name = contact_name
                 contact.save()
+            get_contact_resolver(request).invalidate()
             
             return JsonResponse({'success': True, 'message': 'Contact saved successfully'})
         except Exception as e:
@@ -311,7 +507,7 @@ def save_contact_api(request):
 @login_required
 def groups_page(request):
     """List all groups for the user"""
-    user_groups = request.user.groups.all().prefetch_related('messages')
+    user_groups = with_unread_counts(request.user.chat_groups.all(), request.user, 'group')
     context = {
         'groups': user_groups,
     }
@@ -321,17 +517,37 @@ def groups_page(request):
 def get_group_content(request, group_id):
     """Get group chat content"""
     group = get_object_or_404(Group, id=group_id)
-    if request.user not in group.members.all() and request.user != group.creator:
+    if not can_view_group(request.user, group):
         return HttpResponseForbidden()
     
-    messages_list = group.messages.select_related('sender', 'reply_to').all()
+    messages_list, next_cursor = get_message_page(group.messages.select_related('sender', 'reply_to'))
+    ReadCursor.advance(request.user, timezone.now(), group=group)
     context = {
         'group': group,
         'messages': messages_list,
+        'next_cursor': next_cursor,
+        'history_url': reverse('get_group_history', args=[group.id]),
         'members': group.members.all(),
     }
     return render(request, 'chat/partials/group_content.html', context)
 
+@login_required
+def get_group_history(request, group_id):
+    """Older page of a group's messages (HTMX infinite scroll)"""
+    group = get_object_or_404(Group, id=group_id)
+    if not can_view_group(request.user, group):
+        return HttpResponseForbidden()
+
+    messages_list, next_cursor = get_message_page(
+        group.messages.select_related('sender', 'reply_to'), before=request.GET.get('before')
+    )
+    context = {
+        'messages': messages_list,
+        'next_cursor': next_cursor,
+        'history_url': reverse('get_group_history', args=[group.id]),
+    }
+    return render(request, 'chat/partials/group_messages.html', context)
+
 @login_required
 def create_group(request):
     """Create a new group"""
@@ -379,7 +595,7 @@ def delete_group(request, group_id):
 @login_required
 def channels_page(request):
     """List all channels user is subscribed to"""
-    user_channels = request.user.subscribed_channels.all().prefetch_related('messages')
+    user_channels = with_unread_counts(request.user.subscribed_channels.all(), request.user, 'channel')
     created_channels = Channel.objects.filter(creator=request.user)
     context = {
         'channels': user_channels,
@@ -393,11 +609,14 @@ def get_channel_content(request, channel_id):
     channel = get_object_or_404(Channel, id=channel_id)
     
     # Check permissions
-    if channel.is_public or request.user in channel.subscribers.all() or request.user == channel.creator:
-        messages_list = channel.messages.select_related('sender', 'reply_to').all()
+    if can_view_channel(request.user, channel):
+        messages_list, next_cursor = get_message_page(channel.messages.select_related('sender', 'reply_to'))
+        ReadCursor.advance(request.user, timezone.now(), channel=channel)
         context = {
             'channel': channel,
             'messages': messages_list,
+            'next_cursor': next_cursor,
+            'history_url': reverse('get_channel_history', args=[channel.id]),
             'subscribers': channel.subscribers.all(),
             'is_creator': request.user == channel.creator,
         }
@@ -405,6 +624,23 @@ def get_channel_content(request, channel_id):
     
     return HttpResponseForbidden()
 
+@login_required
+def get_channel_history(request, channel_id):
+    """Older page of a channel's broadcasts (HTMX infinite scroll)"""
+    channel = get_object_or_404(Channel, id=channel_id)
+    if not can_view_channel(request.user, channel):
+        return HttpResponseForbidden()
+
+    messages_list, next_cursor = get_message_page(
+        channel.messages.select_related('sender', 'reply_to'), before=request.GET.get('before')
+    )
+    context = {
+        'messages': messages_list,
+        'next_cursor': next_cursor,
+        'history_url': reverse('get_channel_history', args=[channel.id]),
+    }
+    return render(request, 'chat/partials/channel_messages.html', context)
+
 @login_required
 def create_channel(request):
     """Create a new channel"""
@@ -478,6 +714,8 @@ def delete_message(request):
                 return JsonResponse({'success': False, 'error': 'Not authorized'}, status=403)
             
             msg.delete()
+            if msg.conversation_id:
+                msg.conversation.refresh_last_message()
             return JsonResponse({'success': True, 'message': 'Message deleted'})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -494,28 +732,17 @@ def forward_message(request):
             message_id = data.get('message_id')
             target_chat_id = data.get('target_chat_id')
             
-            msg = get_object_or_404(Message, id=message_id)
-            target_chat = get_object_or_404(Conversation, id=target_chat_id)
-            
-            # Check if user has access to target chat
-            if request.user != target_chat.initiator and request.user != target_chat.receiver:
-                return JsonResponse({'success': False, 'error': 'Not authorized'}, status=403)
-            
-            # Create forwarded message
-            forwarded_msg = Message.objects.create(
-                conversation=target_chat,
-                sender=request.user,
-                text=f"[Forwarded]: {msg.text}",
-                attachment=msg.attachment if msg.attachment else None,
-                is_media=msg.is_media,
-                is_forwarded=True
-            )
+            forwarded = forward_messages(request.user, [message_id], [('conversation', target_chat_id)])
+            if not forwarded:
+                return JsonResponse({'success': False, 'error': 'Message not found'}, status=404)
             
             return JsonResponse({
                 'success': True,
                 'message': 'Message forwarded',
-                'forwarded_message_id': str(forwarded_msg.id)
+                'forwarded_message_id': str(forwarded[0].id)
             })
+        except ForwardError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     
@@ -553,10 +780,14 @@ def bulk_delete_messages(request):
                 return JsonResponse({'success': False, 'error': 'No messages selected'}, status=400)
             
             # Delete only messages owned by current user
-            deleted_count = Message.objects.filter(
-                id__in=message_ids,
-                sender=request.user
-            ).delete()[0]
+            owned = Message.objects.filter(id__in=message_ids, sender=request.user)
+            affected_chat_ids = set(
+                owned.exclude(conversation=None).values_list('conversation_id', flat=True)
+            )
+            deleted_count = owned.delete()[0]
+
+            for chat in Conversation.objects.filter(id__in=affected_chat_ids):
+                chat.refresh_last_message()
             
             return JsonResponse({
                 'success': True,
@@ -570,40 +801,31 @@ def bulk_delete_messages(request):
 @login_required
 @csrf_exempt
 def bulk_forward_messages(request):
-    """Forward multiple selected messages"""
+    """
+    Forward multiple selected messages to one or more rooms:
+    {"message_ids": [...], "targets": [{"type": "conversation"|"group"|"channel", "id": ...}]}
+    (a single {"target_chat_id": ...} is still accepted)
+    """
     if request.method == "POST":
         try:
             data = json.loads(request.body)
             message_ids = data.get('message_ids', [])
-            target_chat_id = data.get('target_chat_id')
+            targets = [(t.get('type'), t.get('id')) for t in data.get('targets', [])]
+            if data.get('target_chat_id'):
+                targets.append(('conversation', data['target_chat_id']))
             
-            if not message_ids or not target_chat_id:
+            if not message_ids or not targets:
                 return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
             
-            target_chat = get_object_or_404(Conversation, id=target_chat_id)
-            
-            # Check authorization
-            if request.user != target_chat.initiator and request.user != target_chat.receiver:
-                return JsonResponse({'success': False, 'error': 'Not authorized'}, status=403)
-            
-            messages_to_forward = Message.objects.filter(id__in=message_ids)
-            forwarded_count = 0
-            
-            for msg in messages_to_forward:
-                forwarded_msg = Message.objects.create(
-                    conversation=target_chat,
-                    sender=request.user,
-                    text=f"[Forwarded]: {msg.text}",
-                    attachment=msg.attachment if msg.attachment else None,
-                    is_media=msg.is_media,
-                    is_forwarded=True
-                )
-                forwarded_count += 1
+            forwarded = forward_messages(request.user, message_ids, targets)
             
             return JsonResponse({
                 'success': True,
-                'message': f'{forwarded_count} message(s) forwarded'
+                'message': f'{len(forwarded)} message(s) forwarded',
+                'forwarded_count': len(forwarded),
             })
+        except ForwardError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     
@@ -0,0 +1,212 @@
+"""
+Shared Redis cache with a small per-process L1 tier and per-prefix hit counters.
+
+Every worker reads and writes the same Redis database, so values such as OTPs
+and sessions are visible wherever the next request lands. Keys starting with
+one of the `l1_prefixes` are also kept in process memory for at most
+`l1_timeout` seconds, which absorbs bursts of reads of the same hot key (e.g.
+a chat list row rendered on every refresh) without a round trip. Writes and
+deletes through this process update its L1 at once; a change made by another
+worker shows up here only after `l1_timeout`. Only list keys whose value
+never changes once written (versioned keys), never sessions, OTPs or other
+auth state.
+
+Reads are counted per key prefix (`stats_prefixes`, longest match, else
+"other") as L1 hits, Redis hits and misses. Each process adds its counts
+to the `metrics:cache` hash in Redis every `stats_flush_seconds`.
+
+    manage.py cache_stats   prints hit ratios per prefix (--reset clears them)
+"""
+import collections
+import logging
+import pickle
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'metrics:cache'
+STATS_FIELDS = ('l1_hits', 'hits', 'misses')
+
+_MISSING = object()
+
+OWN_OPTIONS = ('l1_prefixes', 'l1_timeout', 'l1_max_entries', 'stats_prefixes', 'stats_flush_seconds')
+
+
+class LocalTier:
+    """Thread-safe LRU of pickled values with a per-entry deadline (pickled so callers cannot mutate entries)."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = collections.OrderedDict()  # {key: (deadline, pickled value)}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, timeout=None):
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        if ttl <= 0:
+            self.delete(key)
+            return
+        entry = (time.monotonic() + ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TieredRedisCache(RedisCache):
+    def __init__(self, server, params):
+        options = dict(params.get('OPTIONS', {}))
+        own = {name: options.pop(name) for name in OWN_OPTIONS if name in options}
+        super().__init__(server, {**params, 'OPTIONS': options})
+
+        self.l1_prefixes = tuple(own.get('l1_prefixes', ()))
+        self.l1 = LocalTier(own.get('l1_max_entries', 10000), own.get('l1_timeout', 2))
+        # Longest prefix first, so nested prefixes are counted under the most specific one
+        self.stats_prefixes = sorted(own.get('stats_prefixes', ()), key=len, reverse=True)
+        self.stats_flush_seconds = own.get('stats_flush_seconds', 10)
+        self._stats = collections.Counter()  # {(prefix, field): count} since the last flush
+        self._stats_lock = threading.Lock()
+        self._stats_flushed_at = time.monotonic()
+
+    def in_l1(self, key):
+        return key.startswith(self.l1_prefixes)
+
+    # --- Reads ---
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        local = self.in_l1(key)
+        if local:
+            value = self.l1.get(made_key)
+            if value is not _MISSING:
+                self.record(key, 'l1_hits')
+                return value
+        value = self._cache.get(made_key, _MISSING)
+        if value is _MISSING:
+            self.record(key, 'misses')
+            return default
+        self.record(key, 'hits')
+        if local:
+            self.l1.set(made_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = {}
+        for key in keys:
+            made_key = self.make_and_validate_key(key, version=version)
+            value = self.l1.get(made_key) if self.in_l1(key) else _MISSING
+            if value is _MISSING:
+                remote[made_key] = key
+            else:
+                self.record(key, 'l1_hits')
+                found[key] = value
+        if remote:
+            fetched = self._cache.get_many(remote.keys())
+            for made_key, key in remote.items():
+                if made_key in fetched:
+                    self.record(key, 'hits')
+                    found[key] = fetched[made_key]
+                    if self.in_l1(key):
+                        self.l1.set(made_key, fetched[made_key])
+                else:
+                    self.record(key, 'misses')
+        return found
+
+    def has_key(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        if self.l1.get(made_key) is not _MISSING:
+            return True
+        return self._cache.has_key(made_key)
+
+    # --- Writes: keep this process's L1 in step ---
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        made_key = self.make_and_validate_key(key, version=version)
+        if self.in_l1(key):
+            self.l1.set(made_key, value, self.get_backend_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version)
+        for key, value in data.items():
+            if self.in_l1(key):
+                self.l1.set(self.make_and_validate_key(key, version=version), value, self.get_backend_timeout(timeout))
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version=version))
+        return super().add(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version=version))
+        return super().touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version=version))
+        return super().incr(key, delta, version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version=version))
+        return super().delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.l1.delete(self.make_and_validate_key(key, version=version))
+        return super().delete_many(keys, version)
+
+    def clear(self):
+        self.l1.clear()
+        return super().clear()
+
+    # --- Instrumentation ---
+
+    def prefix_of(self, key):
+        for prefix in self.stats_prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return 'other'
+
+    def record(self, key, field):
+        with self._stats_lock:
+            self._stats[self.prefix_of(key), field] += 1
+            if time.monotonic() - self._stats_flushed_at < self.stats_flush_seconds:
+                return
+            stats, self._stats = self._stats, collections.Counter()
+            self._stats_flushed_at = time.monotonic()
+        self.flush_stats(stats)
+
+    def flush_stats(self, stats):
+        """Add `stats` to the shared hash (best effort: counts are dropped if Redis is down)."""
+        try:
+            pipe = self._cache.get_client(write=True).pipeline(transaction=False)
+            for (prefix, field), count in stats.items():
+                pipe.hincrby(STATS_KEY, f"{prefix}|{field}", count)
+            pipe.execute()
+        except (RedisError, OSError):
+            logger.warning("Could not record cache stats")
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'chat',
     'accounts',
 ]
@@ -147,13 +148,91 @@ MEDIA_ROOT = BASE_DIR / 'uploads'
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 
+# Room groups are consistent-hashed across these Redis nodes (chat/layers.py), e.g.
+# CHANNEL_REDIS_URLS=redis://10.0.0.1:6379,redis://10.0.0.2:6379 (`manage.py redis_nodes` runs local ones).
+# Group members in the sending process are served from memory; Redis only carries
+# messages to other processes.
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "chat.layers.HybridChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)], # Redis port
+            "hosts": os.getenv('CHANNEL_REDIS_URLS', 'redis://127.0.0.1:6379').split(','),
+            "vnodes": 160,  # ring points per node
         },
     },
 }
 
-
+# Shared cache (core/cache.py): every worker sees the same OTPs and sessions. Only
+# immutable, versioned keys (chat list rows) use the per-process L1; auth state such as
+# sessions must never be served from a copy another worker cannot invalidate.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredRedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'OPTIONS': {
+            'l1_prefixes': ['chat_row:'],
+            'l1_timeout': 2,
+            'l1_max_entries': 10000,
+            'stats_prefixes': ['otp_user_', 'django.contrib.sessions.cached_db', 'chat_row:'],  # `manage.py cache_stats`
+        },
+    },
+}
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Write-behind buffer for WebSocket chat messages (chat/persistence.py)
+CHAT_WRITE_BATCH_SIZE = 100
+CHAT_WRITE_MAX_DELAY_MS = 5
+# Durable mode commits each message before it is broadcast to the room
+CHAT_WRITE_DURABLE = os.getenv('CHAT_WRITE_DURABLE', 'False') == 'True'
+
+# Resumable chunked attachment uploads (chat/uploads.py)
+CHAT_UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per PUT
+CHAT_UPLOAD_MAX_SIZE = 2 * 1024 ** 3  # 2 GiB per file
+CHAT_UPLOAD_SESSION_TTL_HOURS = 24  # unfinished sessions older than this are purged
+
+# Image thumbnails/placeholders (chat/media.py): 'thread' runs a pool in each web
+# process, 'worker' leaves pending images to `manage.py process_media`
+CHAT_MEDIA_PIPELINE = os.getenv('CHAT_MEDIA_PIPELINE', 'thread')
+CHAT_MEDIA_THREADS = 2
+
+# Hand media transfers to the front proxy (chat/serving.py): '', 'x-accel-redirect' (nginx) or 'x-sendfile'
+CHAT_MEDIA_ACCEL = os.getenv('CHAT_MEDIA_ACCEL', '')
+CHAT_MEDIA_ACCEL_PREFIX = '/protected-media/'  # nginx `internal` location aliased to MEDIA_ROOT
+
+# Rooms a multiplexed user socket (UserConsumer) follows at most
+CHAT_MUX_MAX_ROOMS = 500
+
+# Presence and typing indicators (chat/presence.py)
+CHAT_REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
+CHAT_PRESENCE_TTL = 60  # seconds a socket stays online without a heartbeat (clients send one every 25s)
+CHAT_TYPING_TTL = 5  # typing frames within this window are coalesced into one broadcast
+
+# Live group/channel delivery (chat/fanout.py): channel-layer groups per room, and
+# the batch size for walking member lists
+CHAT_FANOUT_SHARDS = {'group': 1, 'channel': 8}
+CHAT_FANOUT_BATCH_SIZE = 5000
+
+# Largest inbound WebSocket frame accepted (chat/frames.py)
+CHAT_MAX_FRAME_BYTES = 64 * 1024
+
+# Inbound frame limits (chat/ratelimit.py): frame type -> (tokens per second, burst)
+# per socket, and per user across all their sockets and workers
+CHAT_RATE_LIMITS = {
+    'chat_message': {'connection': (5, 20), 'user': (8, 30)},
+    'call_signal': {'connection': (20, 60), 'user': (30, 90)},
+    'default': {'connection': (10, 30), 'user': (20, 60)},
+}
+# Sockets with this many broadcasts waiting for them are dropped as slow consumers;
+# keep it below the channel layer's per-channel capacity (100), past which the
+# layer silently discards the oldest messages instead
+CHAT_SLOW_CONSUMER_BACKLOG = 50
+
+# Catch-up after reconnects (SyncMixin in chat/consumers.py): messages per `sync`
+# reply, and how often a socket's delivery acks are written to its ReadCursor
+CHAT_SYNC_PAGE_SIZE = 200
+CHAT_ACK_FLUSH_SECONDS = 5
+
+# Chat list row fragments (chat/chat_list.py); keys are versioned, so this only bounds how
+# long superseded rows linger in Redis
+CHAT_ROW_CACHE_SECONDS = 24 * 3600
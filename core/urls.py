@@ -17,14 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from chat.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('accounts.urls')),
+    # Uploads are served with an access check in every environment (chat/serving.py)
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', serve_media, name='serve_media'),
     path('', include('chat.urls')),
-]
-
-# Add this block at the end!
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file